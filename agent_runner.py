@@ -1,15 +1,30 @@
 import asyncio
+import logging
 import re
-from typing import List, Dict, Optional, Any
+import httpx
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
 from langchain_groq import ChatGroq
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 import os
 from dotenv import load_dotenv
 import json
-import uuid
-from datetime import datetime
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from datetime import datetime, timezone
+from llm_batcher import LLMBatcher
+from llm_cache import SemanticCache
+from result_cache import ResultCache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
 
 # Import existing social media agents
 try:
@@ -21,7 +36,7 @@ try:
     from social_media_agents.analysis_agent import build_graph as build_analysis_graph
     from social_media_agents.sponsorship_agent import app as sponsorship_app
 except ImportError as e:
-    print(f"Warning: Could not import some social media agents: {e}")
+    logger.warning("Could not import some social media agents: %s", e)
     # Create mock functions for testing
     def draft_linkedin_post(state): return {"post_draft": "Mock LinkedIn post"}
     def draft_youtube_script(state): return {"script_draft": "Mock YouTube script"}
@@ -31,15 +46,188 @@ except ImportError as e:
 # Load environment variables
 load_dotenv()
 
+def _json_default(obj: Any) -> Any:
+    """Serialize pydantic models (e.g. Idea) nested in workflow responses"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return str(obj)
+
+@lru_cache(maxsize=256)
+def _is_coroutine_function(func: Callable) -> bool:
+    """asyncio.iscoroutinefunction, resolved once per workflow function"""
+    return asyncio.iscoroutinefunction(func)
+
+def _format_timestamp(ts_ns: int) -> str:
+    """ISO-8601 UTC string for an epoch timestamp in nanoseconds"""
+    return datetime.fromtimestamp(ts_ns / 1e9, tz=timezone.utc).isoformat()
+
+_URL_PREFIX_RE = re.compile(r"^https?://", re.ASCII)
+_URL_RE = re.compile(r"https?://\S+", re.ASCII)
+
+# The ideas schema never changes, so its format instructions are rendered once
+_IDEAS_FORMAT_INSTRUCTIONS = JsonOutputParser(pydantic_object=IdeasList).get_format_instructions()
+# Models sometimes wrap JSON in a markdown code fence despite the instructions
+_CODE_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+# Upper bound for a single LLM or external workflow call, in seconds
+_CALL_TIMEOUT = 60
+
+# Any of these routes straight to the complete LinkedIn workflow
+_LINKEDIN_WORKFLOW_KEYWORDS = frozenset(("linkedin", "post", "publish", "share"))
+_WORD_RE = re.compile(r"[a-z][a-z0-9_]*")
+
+def _keyword_tokens(text: str) -> FrozenSet[str]:
+    """Whole lowercase words of text, their naive singulars and adjacent word pairs"""
+    words = _WORD_RE.findall(text.lower())
+    tokens = set(words)
+    tokens.update(w[:-1] for w in words if len(w) > 3 and w.endswith("s"))
+    tokens.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return frozenset(tokens)
+
+# Common niches recognised without an LLM round-trip; anything else falls back to the LLM
+_NICHE_KEYWORDS = {
+    "ai": "artificial intelligence",
+    "ml": "machine learning",
+    "technology": "technology",
+    "tech": "technology",
+    "marketing": "marketing",
+    "startup": "startups",
+    "startups": "startups",
+    "finance": "finance",
+    "fintech": "fintech",
+    "crypto": "cryptocurrency",
+    "leadership": "leadership",
+    "productivity": "productivity",
+    "career": "career growth",
+    "fitness": "fitness",
+    "design": "design",
+}
+# Words that may surround a niche keyword without changing what the niche is
+_NICHE_FILLER_WORDS = frozenset((
+    "a", "an", "the", "and", "about", "on", "in", "for", "of", "my", "i", "me",
+    "want", "need", "write", "some", "linkedin", "post", "posts", "content", "ideas",
+))
+
+# Chat messages containing any of these are routed to an agent
+_AGENT_TRIGGER_KEYWORDS = frozenset(("analyze", "generate", "create", "post", "publish", "draft"))
+
+# Workflow step commands: the first row with a word present in the message wins
+_SELECTION_COMMANDS = (("refine", frozenset(("refine", "more"))),)
+_APPROVAL_COMMANDS = (
+    ("publish", frozenset(("publish", "post"))),
+    ("edit", frozenset(("change", "edit"))),
+)
+
+def _match_command(text: str, commands) -> Optional[str]:
+    """Return the command triggered by text, tokenizing it only once"""
+    tokens = _keyword_tokens(text)
+    for command, words in commands:
+        if not words.isdisjoint(tokens):
+            return command
+    return None
+
+# Chat routing: the first platform keyword present picks a row, then its first matching
+# intent picks the agent (None matches unconditionally)
+_CHAT_ROUTES = (
+    ("linkedin", (("idea", "linkedin_ideation"), ("draft", "linkedin_drafting"), ("publish", "linkedin_publishing"))),
+    ("youtube", (("script", "youtube_script"), ("publish", "youtube_publishing"))),
+    ("analyze", ((None, "content_analysis"),)),
+    ("sponsorship", ((None, "sponsorship_agent"),)),
+)
 class AgentConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     name: str
     description: str
-    keywords: List[str]
+    keywords: Tuple[str, ...]
     function_name: str
-    required_params: List[str]
+    required_params: Tuple[str, ...]
+
+# The agent registry is static, so it is built and validated once at import
+_AGENTS: Mapping[str, AgentConfig] = MappingProxyType({
+    "linkedin_workflow": AgentConfig(
+        name="LinkedIn Complete Workflow",
+        description="Complete LinkedIn workflow from ideation to publishing",
+        keywords=["linkedin", "post", "workflow", "publish", "complete"],
+        function_name="execute_linkedin_workflow",
+        required_params=["user_input"]
+    ),
+    "linkedin_ideation": AgentConfig(
+        name="LinkedIn Ideation Agent",
+        description="Generates content ideas for LinkedIn posts",
+        keywords=["linkedin", "post", "content", "idea", "social media"],
+        function_name="generate_linkedin_ideas",
+        required_params=["user_niche", "platform_choice"]
+    ),
+    "linkedin_drafting": AgentConfig(
+        name="LinkedIn Drafting Agent",
+        description="Creates draft LinkedIn posts from ideas",
+        keywords=["linkedin", "draft", "write", "post", "content"],
+        function_name="draft_linkedin_post",
+        required_params=["selected_idea", "niche"]
+    ),
+    "linkedin_publishing": AgentConfig(
+        name="LinkedIn Publishing Agent",
+        description="Publishes content to LinkedIn",
+        keywords=["linkedin", "publish", "post", "upload", "share"],
+        function_name="publish_to_linkedin",
+        required_params=["post_draft", "media_url"]
+    ),
+    "youtube_script": AgentConfig(
+        name="YouTube Script Agent",
+        description="Creates YouTube video scripts",
+        keywords=["youtube", "script", "video", "content", "script"],
+        function_name="draft_youtube_script",
+        required_params=["selected_idea", "niche"]
+    ),
+    "youtube_publishing": AgentConfig(
+        name="YouTube Publishing Agent",
+        description="Publishes content to YouTube",
+        keywords=["youtube", "publish", "video", "upload", "share"],
+        function_name="publish_to_youtube",
+        required_params=["video_file", "title", "description"]
+    ),
+    "content_analysis": AgentConfig(
+        name="Content Analysis Agent",
+        description="Analyzes content performance and trends",
+        keywords=["analysis", "trend", "performance", "insights", "metrics"],
+        function_name="analyze_content",
+        required_params=["content_url", "platform"]
+    ),
+    "sponsorship_agent": AgentConfig(
+        name="Sponsorship Agent",
+        description="Finds sponsorship opportunities",
+        keywords=["sponsorship", "brand", "partnership", "monetization"],
+        function_name="find_sponsorships",
+        required_params=["niche", "audience_size"]
+    )
+})
+_AGENT_RANK = {agent_id: rank for rank, agent_id in enumerate(_AGENTS)}
+_AGENT_INFO: Mapping[str, Dict[str, Any]] = MappingProxyType({
+    name: {
+        "description": agent.description,
+        "keywords": agent.keywords,
+        "required_params": agent.required_params
+    }
+    for name, agent in _AGENTS.items()
+})
+
+# Only the newest messages of a workflow are kept; trimming happens in batches of the slack
+_MAX_MESSAGES = 500
+_MESSAGE_TRIM_SLACK = 50
+# Workflows in these states are dropped sooner than idle in-progress ones
+_FINISHED_STATUSES = frozenset(("completed", "cancelled", "error", "completed_simulation"))
 
 class LinkedInWorkflowState:
     """State management for LinkedIn workflow execution"""
+    __slots__ = (
+        "workflow_id", "user_input", "current_step", "user_niche", "platform_choice",
+        "_content_ideas", "_ideas_text", "_idea_options", "selected_idea", "post_draft", "media_url", "media_asset_urn",
+        "error", "status",
+        "_msg_ids", "_msg_senders", "_msg_contents", "_msg_timestamps", "_msg_types",
+        "_msg_counter", "draft_event",
+    )
+
     def __init__(self, workflow_id: str, user_input: str):
         self.workflow_id = workflow_id
         self.user_input = user_input
@@ -52,108 +240,249 @@ class LinkedInWorkflowState:
         self.media_url = None
         self.media_asset_urn = None
         self.error = None
-        self.messages = []
         self.status = "processing"
+        # Message log is stored column-wise; rows are only assembled when serialized
+        self._msg_ids: List[str] = []
+        self._msg_senders: List[str] = []
+        self._msg_contents: List[str] = []
+        self._msg_timestamps: List[int] = []
+        self._msg_types: List[str] = []
+        self._msg_counter = 0
+        # Set whenever post_draft grows while a draft is being streamed from the LLM
+        self.draft_event = asyncio.Event()
+
+    @property
+    def content_ideas(self) -> Optional[List[Idea]]:
+        return self._content_ideas
+
+    @content_ideas.setter
+    def content_ideas(self, ideas: Optional[List[Idea]]) -> None:
+        # New ideas invalidate the renderings derived from the previous set
+        self._content_ideas = ideas
+        self._ideas_text = None
+        self._idea_options = None
+
+    @property
+    def ideas_text(self) -> str:
+        """Numbered idea titles for chat prompts, formatted once per idea set"""
+        if self._ideas_text is None:
+            self._ideas_text = "\n".join(f"{i}. {idea.title}" for i, idea in enumerate(self._content_ideas or [], 1))
+        return self._ideas_text
+
+    @property
+    def idea_options(self) -> List[Dict[str, Any]]:
+        """Selection options for required_input, built once per idea set"""
+        if self._idea_options is None:
+            self._idea_options = [{"index": i, "title": idea.title} for i, idea in enumerate(self._content_ideas or [], 1)]
+        return self._idea_options
+
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        """Messages as row dicts for API responses"""
+        return [
+            {"id": i, "sender": s, "content": c, "timestamp": _format_timestamp(t), "message_type": m}
+            for i, s, c, t, m in zip(self._msg_ids, self._msg_senders, self._msg_contents,
+                                     self._msg_timestamps, self._msg_types)
+        ]
         
-    def add_message(self, sender: str, content: str, message_type: str = "agent_result"):
-        """Add a message to the workflow"""
-        message = {
-            "id": str(uuid.uuid4()),
-            "sender": sender,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat(),
-            "message_type": message_type
+    def add_message(self, sender: str, content: str, message_type: str = "agent_result") -> str:
+        """Add a message to the workflow and return its ID"""
+        # IDs only need to be unique within the workflow; timestamps are formatted lazily
+        self._msg_counter += 1
+        message_id = f"{self.workflow_id}-{self._msg_counter}"
+        ts_ns = time.time_ns()
+        self._msg_ids.append(message_id)
+        self._msg_senders.append(sender)
+        self._msg_contents.append(content)
+        self._msg_timestamps.append(ts_ns)
+        self._msg_types.append(message_type)
+        overflow = len(self._msg_ids) - _MAX_MESSAGES
+        if overflow >= _MESSAGE_TRIM_SLACK:
+            for column in (self._msg_ids, self._msg_senders, self._msg_contents,
+                           self._msg_timestamps, self._msg_types):
+                del column[:overflow]
+        return message_id
+
+    def to_response_bytes(self, **extra: Any) -> bytes:
+        """Serialize the workflow state straight to JSON bytes for an HTTP response"""
+        payload = {
+            "workflow_id": self.workflow_id,
+            "status": self.status,
+            "current_step": self.current_step,
+            "messages": self.messages,
+            **extra,
         }
-        self.messages.append(message)
-        return message
+        if orjson is not None:
+            return orjson.dumps(payload, default=_json_default)
+        return json.dumps(payload, default=_json_default).encode("utf-8")
+
+class ActiveWorkflows:
+    """LRU map of workflow id -> state; entries idle longer than ttl seconds are dropped"""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600, finished_ttl: float = 600,
+                 gc_interval: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.finished_ttl = finished_ttl
+        self.gc_interval = gc_interval
+        # Ordered by last access, so the oldest entries are always at the front
+        self._entries: "OrderedDict[str, Tuple[float, LinkedInWorkflowState]]" = OrderedDict()
+        self._gc_task: Optional[asyncio.Task] = None
+
+    def get(self, workflow_id: str, default: Optional[LinkedInWorkflowState] = None) -> Optional[LinkedInWorkflowState]:
+        entry = self._entries.get(workflow_id)
+        if entry is None:
+            return default
+        now = time.monotonic()
+        if now - entry[0] > self.ttl:
+            del self._entries[workflow_id]
+            return default
+        self._entries[workflow_id] = (now, entry[1])
+        self._entries.move_to_end(workflow_id)
+        return entry[1]
+
+    def __getitem__(self, workflow_id: str) -> LinkedInWorkflowState:
+        state = self.get(workflow_id)
+        if state is None:
+            raise KeyError(workflow_id)
+        return state
+
+    def __setitem__(self, workflow_id: str, state: LinkedInWorkflowState) -> None:
+        self._entries[workflow_id] = (time.monotonic(), state)
+        self._entries.move_to_end(workflow_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        self._ensure_gc()
+
+    def __contains__(self, workflow_id: str) -> bool:
+        return self.get(workflow_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def values(self) -> List[LinkedInWorkflowState]:
+        return [state for _, state in self._entries.values()]
+
+    def evict_expired(self) -> None:
+        """Drop idle entries: after ttl seconds, or finished_ttl once the workflow has finished"""
+        now = time.monotonic()
+        cutoff = now - self.ttl
+        while self._entries:
+            workflow_id, (last_access, _) = next(iter(self._entries.items()))
+            if last_access > cutoff:
+                break
+            del self._entries[workflow_id]
+        finished_cutoff = now - self.finished_ttl
+        for workflow_id, (last_access, state) in list(self._entries.items()):
+            if last_access > finished_cutoff:
+                break
+            if state.status in _FINISHED_STATUSES:
+                del self._entries[workflow_id]
+
+    def _ensure_gc(self) -> None:
+        # Started lazily, like LLMBatcher, since AgentRunner is built before the event loop runs
+        if self._gc_task is None or self._gc_task.done():
+            try:
+                self._gc_task = asyncio.get_running_loop().create_task(self._gc_loop())
+            except RuntimeError:
+                pass
+
+    async def _gc_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.gc_interval)
+            self.evict_expired()
 
 class AgentRunner:
     def __init__(self):
-        self.agents = self._initialize_agents()
-        self.llm = ChatGroq(model="llama3-8b-8192", temperature=0.5)
-        self.active_workflows: Dict[str, LinkedInWorkflowState] = {}
+        self.agents = _AGENTS
+        self._keyword_agents = self._build_keyword_index()
+        # One pooled client for every chain so TCP/TLS connections are kept alive between calls
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+        self.llm = ChatGroq(model="llama3-8b-8192", temperature=0.5, http_async_client=self._http_client)
+        self._build_chains()
+        # Abandoned workflows age out instead of accumulating for the life of the process
+        self.active_workflows = ActiveWorkflows()
+        # Paraphrased niches/ideas/drafts reuse earlier LLM outputs instead of a new round-trip
+        # Niche and ideas answers are reused only for the same normalized prompt
+        self.llm_cache = SemanticCache(exact_namespaces=("niche", "ideas"))
+        # Niche and ideas for an exact prompt, shared across workers through Redis
+        self.result_cache = ResultCache()
+        # Concurrent workflows share one batcher so LLM calls fan out under a common limit
+        self.llm_batcher = LLMBatcher()
+        # Bounds how many independent agents of one request run at the same time
+        self._agent_semaphore = asyncio.Semaphore(8)
+        # (namespace, prompt) -> LLM call currently running for it
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._agent_dispatch = self._build_agent_dispatch()
         
-    def _initialize_agents(self) -> Dict[str, AgentConfig]:
-        """Initialize available agents"""
-        return {
-            "linkedin_workflow": AgentConfig(
-                name="LinkedIn Complete Workflow",
-                description="Complete LinkedIn workflow from ideation to publishing",
-                keywords=["linkedin", "post", "workflow", "publish", "complete"],
-                function_name="execute_linkedin_workflow",
-                required_params=["user_input"]
-            ),
-            "linkedin_ideation": AgentConfig(
-                name="LinkedIn Ideation Agent",
-                description="Generates content ideas for LinkedIn posts",
-                keywords=["linkedin", "post", "content", "idea", "social media"],
-                function_name="generate_linkedin_ideas",
-                required_params=["user_niche", "platform_choice"]
-            ),
-            "linkedin_drafting": AgentConfig(
-                name="LinkedIn Drafting Agent",
-                description="Creates draft LinkedIn posts from ideas",
-                keywords=["linkedin", "draft", "write", "post", "content"],
-                function_name="draft_linkedin_post",
-                required_params=["selected_idea", "niche"]
-            ),
-            "linkedin_publishing": AgentConfig(
-                name="LinkedIn Publishing Agent",
-                description="Publishes content to LinkedIn",
-                keywords=["linkedin", "publish", "post", "upload", "share"],
-                function_name="publish_to_linkedin",
-                required_params=["post_draft", "media_url"]
-            ),
-            "youtube_script": AgentConfig(
-                name="YouTube Script Agent",
-                description="Creates YouTube video scripts",
-                keywords=["youtube", "script", "video", "content", "script"],
-                function_name="draft_youtube_script",
-                required_params=["selected_idea", "niche"]
-            ),
-            "youtube_publishing": AgentConfig(
-                name="YouTube Publishing Agent",
-                description="Publishes content to YouTube",
-                keywords=["youtube", "publish", "video", "upload", "share"],
-                function_name="publish_to_youtube",
-                required_params=["video_file", "title", "description"]
-            ),
-            "content_analysis": AgentConfig(
-                name="Content Analysis Agent",
-                description="Analyzes content performance and trends",
-                keywords=["analysis", "trend", "performance", "insights", "metrics"],
-                function_name="analyze_content",
-                required_params=["content_url", "platform"]
+    def _build_chains(self) -> None:
+        """Build prompt chains once so each LLM step only pays for ainvoke"""
+        self._niche_chain = PromptTemplate(
+            template="Extract the main topic or niche from this user input. Return only the topic, nothing else.\n\nUser input: {user_input}",
+            input_variables=["user_input"]
+        ) | self.llm
+        self._ideas_chain = PromptTemplate(
+            template="""
+            You are a content trend analyst for LinkedIn.
+            Based on the niche: {user_niche}, generate 5 highly engaging post ideas.
+            Return ONLY a JSON object that adheres strictly to the following schema. Do NOT include any conversational text, code block syntax, or any other formatting.
+            
+            {format_instructions}
+            """,
+            input_variables=["user_niche"],
+            partial_variables={"format_instructions": _IDEAS_FORMAT_INSTRUCTIONS},
+        ) | self.llm
+        self._draft_chain = PromptTemplate(
+            template="""
+            You are a master copywriter for LinkedIn.
+            Based on the following idea, draft a professional and engaging LinkedIn post.
+            Use relevant hashtags and a clear call to action.
+            Return ONLY the post text and nothing else.
+            
+            Idea: {idea_title} - {idea_summary}
+            """,
+            input_variables=["idea_title", "idea_summary"],
+        ) | self.llm
+        self._refine_chain = PromptTemplate(
+            template=(
+                "You are editing a LinkedIn post. Apply the user's requested changes to improve the draft.\n"
+                "Keep the tone professional and engaging. Return only the revised post text.\n\n"
+                "Original draft:\n{draft}\n\nUser requests:\n{instructions}\n"
             ),
-            "sponsorship_agent": AgentConfig(
-                name="Sponsorship Agent",
-                description="Finds sponsorship opportunities",
-                keywords=["sponsorship", "brand", "partnership", "monetization"],
-                function_name="find_sponsorships",
-                required_params=["niche", "audience_size"]
-            )
-        }
-    
+            input_variables=["draft", "instructions"],
+        ) | self.llm
+
+    def _build_keyword_index(self) -> Dict[str, Tuple[str, ...]]:
+        """Inverted index: keyword -> ids of the agents that list it"""
+        keyword_agents: Dict[str, List[str]] = defaultdict(list)
+        for agent_id, agent in self.agents.items():
+            for keyword in agent.keywords:
+                agent_ids = keyword_agents[keyword.lower()]
+                if agent_id not in agent_ids:
+                    agent_ids.append(agent_id)
+        return {k: tuple(v) for k, v in keyword_agents.items()}
+
     async def analyze_input(self, user_input: str) -> List[str]:
         """Analyze user input and determine which agents to run"""
-        print(f"Analyzing input: {user_input}")
+        logger.debug("Analyzing input: %s", user_input)
+        
+        tokens = _keyword_tokens(user_input)
         
         # Check if this is a LinkedIn workflow request
-        linkedin_keywords = ["linkedin", "post", "publish", "share"]
-        if any(keyword in user_input.lower() for keyword in linkedin_keywords):
+        if tokens & _LINKEDIN_WORKFLOW_KEYWORDS:
             return ["linkedin_workflow"]
         
-        # Check for other agent types
-        selected_agents = []
-        for agent_id, agent in self.agents.items():
-            if any(keyword in user_input.lower() for keyword in agent.keywords):
-                selected_agents.append(agent_id)
+        # Check for other agent types, keeping registry order
+        matched = {agent_id for token in tokens for agent_id in self._keyword_agents.get(token, ())}
+        selected_agents = sorted(matched, key=_AGENT_RANK.__getitem__)
         
         return selected_agents if selected_agents else ["linkedin_workflow"]
 
     async def execute_linkedin_workflow(self, workflow_id: str, user_input: str) -> Dict[str, Any]:
         """Execute the complete LinkedIn workflow"""
-        print(f"Starting LinkedIn workflow: {workflow_id}")
+        logger.info("Starting LinkedIn workflow: %s", workflow_id)
         
         # Initialize workflow state
         workflow_state = LinkedInWorkflowState(workflow_id, user_input)
@@ -162,20 +491,33 @@ class AgentRunner:
         # Add initial message
         workflow_state.add_message("system", "Starting LinkedIn workflow...", "system")
         
+        cached = await self.result_cache.get("linkedin_ideas", user_input)
+        
         # Extract niche from user input
-        niche = await self._extract_niche(user_input)
+        if cached is not None:
+            niche = cached["niche"]
+        else:
+            niche = self._extract_niche_fast(user_input)
+            if niche == "general":
+                niche = await self._extract_niche_llm(user_input)
         workflow_state.user_niche = niche
         workflow_state.add_message("system", f"Detected niche: {niche}", "system")
         
         # Generate content ideas
-        ideas = await self._generate_linkedin_ideas(workflow_state)
+        if cached is not None:
+            ideas = [Idea(**idea) for idea in cached["ideas"]]
+        else:
+            ideas = await self._generate_linkedin_ideas(workflow_state)
+            if ideas:
+                await self.result_cache.set("linkedin_ideas", user_input, {
+                    "niche": niche, "ideas": [idea.model_dump() for idea in ideas]
+                })
         if ideas:
             workflow_state.content_ideas = ideas
             workflow_state.add_message("system", f"Generated {len(ideas)} content ideas", "system")
             
             # Present ideas to user
-            ideas_text = "\n".join([f"{i+1}. {idea.title}" for i, idea in enumerate(ideas)])
-            workflow_state.add_message("ai", f"Here are some LinkedIn post ideas for '{niche}':\n\n{ideas_text}\n\nPlease select an idea (1-{len(ideas)}) or ask me to refine them.", "agent_result")
+            workflow_state.add_message("ai", f"Here are some LinkedIn post ideas for '{niche}':\n\n{workflow_state.ideas_text}\n\nPlease select an idea (1-{len(ideas)}) or ask me to refine them.", "agent_result")
             workflow_state.current_step = "waiting_for_selection"
             workflow_state.status = "waiting_for_user"
         else:
@@ -190,50 +532,70 @@ class AgentRunner:
             "content_ideas": ideas,
             "required_input": {
                 "kind": "selection" if ideas else None,
-                "options": [
-                    {"index": i+1, "title": idea.title}
-                    for i, idea in enumerate(ideas or [])
-                ]
+                "options": workflow_state.idea_options
             }
         }
 
-    async def _extract_niche(self, user_input: str) -> str:
+    def _extract_niche_fast(self, user_input: str) -> str:
+        """Extract niche from user input by keyword, or "general" to defer to the LLM"""
+        # Only input naming exactly one niche and nothing else is resolved here; "AI ethics
+        # in healthcare" or "fintech startups" need the LLM to pick the real niche
+        niches = set()
+        for word in _WORD_RE.findall(user_input.lower()):
+            niche = _NICHE_KEYWORDS.get(word)
+            if niche:
+                niches.add(niche)
+            elif word not in _NICHE_FILLER_WORDS:
+                return "general"
+        return niches.pop() if len(niches) == 1 else "general"
+
+    async def _coalesce(self, key: Tuple[str, str], make_call) -> Any:
+        """Share one in-flight LLM call between concurrent callers with the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller being cancelled does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _extract_niche_llm(self, user_input: str) -> str:
         """Extract niche from user input using LLM"""
+        cached = await self.llm_cache.lookup("niche", user_input)
+        if cached is not None:
+            return cached
         try:
-            prompt = PromptTemplate(
-                template="Extract the main topic or niche from this user input. Return only the topic, nothing else.\n\nUser input: {user_input}",
-                input_variables=["user_input"]
+            response = await self._coalesce(
+                ("niche", user_input),
+                lambda: self.llm_batcher.submit(self._niche_chain, {"user_input": user_input}),
             )
-            chain = prompt | self.llm
-            response = await chain.ainvoke({"user_input": user_input})
-            return response.content.strip()
+            niche = response.content.strip()
+            self.llm_cache.store("niche", user_input, niche)
+            return niche
         except Exception as e:
-            print(f"Error extracting niche: {e}")
+            logger.error("Error extracting niche: %s", e)
             return "general content"
 
-    async def _generate_linkedin_ideas(self, workflow_state: LinkedInWorkflowState) -> List[Idea]:
+    async def _generate_linkedin_ideas(self, workflow_state: LinkedInWorkflowState, use_cache: bool = True) -> List[Idea]:
         """Generate LinkedIn content ideas"""
+        if use_cache:
+            cached = await self.llm_cache.lookup("ideas", workflow_state.user_niche)
+            if cached is not None:
+                return [Idea(**idea) for idea in cached]
         try:
-            parser = JsonOutputParser(pydantic_object=IdeasList)
-            prompt = PromptTemplate(
-                template="""
-                You are a content trend analyst for LinkedIn.
-                Based on the niche: {user_niche}, generate 5 highly engaging post ideas.
-                Return ONLY a JSON object that adheres strictly to the following schema. Do NOT include any conversational text, code block syntax, or any other formatting.
-                
-                {format_instructions}
-                """,
-                input_variables=["user_niche"],
-                partial_variables={"format_instructions": parser.get_format_instructions()},
+            niche = workflow_state.user_niche
+            # Bursts of refine requests for the same niche share one generation
+            response = await self._coalesce(
+                ("ideas", niche),
+                lambda: self.llm_batcher.submit(self._ideas_chain, {"user_niche": niche}),
             )
-            chain = prompt | self.llm | parser
-            ideas_dict = await chain.ainvoke({"user_niche": workflow_state.user_niche})
-            
-            if ideas_dict and "ideas" in ideas_dict:
-                return [Idea(**idea) for idea in ideas_dict["ideas"]]
-            return []
+            # Validate straight from the JSON text into typed Idea objects in one pass
+            ideas = IdeasList.model_validate_json(_CODE_FENCE_RE.sub("", response.content)).ideas
+            if ideas:
+                self.llm_cache.store("ideas", workflow_state.user_niche, [idea.model_dump() for idea in ideas])
+            return ideas
         except Exception as e:
-            print(f"Error generating ideas: {e}")
+            logger.error("Error generating ideas: %s", e)
             # Surface error into chat so the user can retry
             try:
                 workflow_state.add_message("ai", "❌ Failed to generate ideas. Please try again.", "agent_result")
@@ -244,38 +606,35 @@ class AgentRunner:
     async def _draft_linkedin_post(self, workflow_state: LinkedInWorkflowState) -> str:
         """Draft a LinkedIn post using the agent"""
         try:
-            prompt = PromptTemplate(
-                template="""
-                You are a master copywriter for LinkedIn.
-                Based on the following idea, draft a professional and engaging LinkedIn post.
-                Use relevant hashtags and a clear call to action.
-                Return ONLY the post text and nothing else.
-                
-                Idea: {idea_title} - {idea_summary}
-                """,
-                input_variables=["idea_title", "idea_summary"],
-            )
-            
-            chain = prompt | self.llm
-            response = await chain.ainvoke({
+            draft = await self._stream_draft(workflow_state, self._draft_chain, {
                 "idea_title": workflow_state.selected_idea.title,
                 "idea_summary": workflow_state.selected_idea.summary,
             })
-            try:
-                print("[LLM draft_linkedin_post raw]:", response.content[:400])
-            except Exception:
-                pass
-            return response.content.strip()
+            logger.debug("LLM draft_linkedin_post raw: %.400s", draft)
+            return draft
         except Exception as e:
-            print(f"Error drafting post: {e}")
+            logger.error("Error drafting post: %s", e)
             return "Error generating post draft"
 
+    async def _stream_draft(self, workflow_state: LinkedInWorkflowState, chain, inputs: Dict[str, Any]) -> str:
+        """Stream chain output into workflow_state.post_draft so subscribers see it as tokens arrive"""
+        async def consume() -> str:
+            draft = ""
+            async for chunk in chain.astream(inputs):
+                draft += chunk.content
+                workflow_state.post_draft = draft
+                workflow_state.draft_event.set()
+            return draft.strip()
+        # Callers hold the workflow lock, so a stalled stream must not hold it forever
+        return await asyncio.wait_for(consume(), timeout=_CALL_TIMEOUT)
+
     async def _handle_approval_realtime(self, workflow_state: LinkedInWorkflowState, user_message: str) -> Dict[str, Any]:
         """Handle post drafting step"""
-        if "publish" in user_message.lower() or "post" in user_message.lower():
+        command = _match_command(user_message, _APPROVAL_COMMANDS)
+        if command == "publish":
             workflow_state.current_step = "publishing"
             workflow_state.add_message("ai", "Great! I'm ready to publish your LinkedIn post. Do you have an image or video URL to include? (Type 'none' if not)", "agent_result")
-        elif "change" in user_message.lower() or "edit" in user_message.lower():
+        elif command == "edit":
             workflow_state.add_message("ai", "What changes would you like me to make to the post?", "agent_result")
             workflow_state.current_step = "refining"
         else:
@@ -294,7 +653,7 @@ class AgentRunner:
             media_input = user_message.strip()
             if media_input.lower() != "none":
                 # Basic URL validation
-                if not re.match(r"^https?://", media_input):
+                if not _URL_PREFIX_RE.match(media_input):
                     workflow_state.add_message("ai", "⚠️ Please provide a valid image/video URL or type 'none'.", "agent_result")
                     return {
                         "workflow_id": workflow_state.workflow_id,
@@ -325,10 +684,7 @@ class AgentRunner:
                 try:
                     agent_state = self._to_agent_state_dict(workflow_state)
                     upload_res = await self._safe_call(upload_media_to_linkedin, agent_state)
-                    try:
-                        print("[Agent upload_media_to_linkedin output]:", upload_res)
-                    except Exception:
-                        pass
+                    logger.debug("upload_media_to_linkedin output: %s", upload_res)
                     if isinstance(upload_res, dict):
                         self._merge_agent_state(workflow_state, upload_res)
                 except Exception as up_e:
@@ -337,10 +693,7 @@ class AgentRunner:
             # Call the real LinkedIn publishing function
             agent_state = self._to_agent_state_dict(workflow_state)
             publish_res = await self._safe_call(publish_to_linkedin, agent_state)
-            try:
-                print("[Agent publish_to_linkedin output]:", publish_res)
-            except Exception:
-                pass
+            logger.debug("publish_to_linkedin output: %s", publish_res)
             if isinstance(publish_res, dict) and publish_res.get("error"):
                 workflow_state.add_message("ai", f"❌ Error publishing to LinkedIn: {publish_res['error']}", "agent_result")
                 workflow_state.status = "error"
@@ -392,22 +745,12 @@ class AgentRunner:
                 "current_step": workflow_state.current_step,
                 "messages": workflow_state.messages
             }
+        previous_draft = workflow_state.post_draft
         try:
-            prompt = PromptTemplate(
-                template=(
-                    "You are editing a LinkedIn post. Apply the user's requested changes to improve the draft.\n"
-                    "Keep the tone professional and engaging. Return only the revised post text.\n\n"
-                    "Original draft:\n{draft}\n\nUser requests:\n{instructions}\n"
-                ),
-                input_variables=["draft", "instructions"],
-            )
-            chain = prompt | self.llm
-            with asyncio.timeout(60):
-                resp = await chain.ainvoke({
-                    "draft": workflow_state.post_draft,
-                    "instructions": user_message,
-                })
-            workflow_state.post_draft = resp.content.strip()
+            workflow_state.post_draft = await self._stream_draft(workflow_state, self._refine_chain, {
+                "draft": previous_draft,
+                "instructions": user_message,
+            })
             workflow_state.add_message("ai", f"📝 Here's the updated draft:\n\n{workflow_state.post_draft}\n\nType 'publish' to post, or give more changes.", "agent_result")
             workflow_state.current_step = "waiting_for_approval"
             return {
@@ -418,6 +761,7 @@ class AgentRunner:
                 "post_draft": workflow_state.post_draft
             }
         except Exception as e:
+            workflow_state.post_draft = previous_draft
             workflow_state.add_message("ai", f"❌ Failed to refine the draft: {e}", "agent_result")
             return {"error": str(e)}
 
@@ -433,7 +777,8 @@ class AgentRunner:
             if step in ("start", "waiting_for_selection"):
                 # Selection or commands
                 text = user_message.strip().lower()
-                if text.isdigit() and state.content_ideas:
+                # ASCII-only and short, so int() cannot see Unicode digits or huge inputs
+                if len(text) <= 3 and text.isascii() and text.isdecimal() and state.content_ideas:
                     idx = int(text)
                     if 1 <= idx <= len(state.content_ideas):
                         state.selected_idea = state.content_ideas[idx - 1]
@@ -455,14 +800,13 @@ class AgentRunner:
                         }
                     else:
                         state.add_message("ai", f"Please enter a number between 1 and {len(state.content_ideas)}.", "agent_result")
-                elif "refine" in text or "more" in text:
+                elif _match_command(text, _SELECTION_COMMANDS) == "refine":
                     # Regenerate ideas
                     state.add_message("ai", "Generating new ideas...", "agent_result")
-                    new_ideas = await self._generate_linkedin_ideas(state)
+                    new_ideas = await self._generate_linkedin_ideas(state, use_cache=False)
                     state.content_ideas = new_ideas
                     if new_ideas:
-                        ideas_text = "\n".join([f"{i+1}. {idea.title}" for i, idea in enumerate(new_ideas)])
-                        state.add_message("ai", f"Here are some refined ideas:\n\n{ideas_text}\n\nSelect 1-{len(new_ideas)}.", "agent_result")
+                        state.add_message("ai", f"Here are some refined ideas:\n\n{state.ideas_text}\n\nSelect 1-{len(new_ideas)}.", "agent_result")
                         return {
                             "workflow_id": state.workflow_id,
                             "status": state.status,
@@ -471,10 +815,7 @@ class AgentRunner:
                             "content_ideas": state.content_ideas,
                             "required_input": {
                                 "kind": "selection",
-                                "options": [
-                                    {"index": i+1, "title": idea.title}
-                                    for i, idea in enumerate(new_ideas)
-                                ]
+                                "options": state.idea_options
                             }
                         }
                     else:
@@ -489,10 +830,7 @@ class AgentRunner:
                         "content_ideas": state.content_ideas,
                         "required_input": {
                             "kind": "selection",
-                            "options": [
-                                {"index": i+1, "title": idea.title}
-                                for i, idea in enumerate(state.content_ideas or [])
-                            ]
+                            "options": state.idea_options
                         }
                     }
             elif step == "waiting_for_approval":
@@ -521,10 +859,9 @@ class AgentRunner:
     async def _safe_call(self, func, state):
         """Call external workflow function with timeout and error capture."""
         try:
-            with asyncio.timeout(60):
-                if asyncio.iscoroutinefunction(func):
-                    return await func(state)
-                return func(state)
+            if _is_coroutine_function(func):
+                return await asyncio.wait_for(func(state), timeout=_CALL_TIMEOUT)
+            return func(state)
         except Exception as e:
             return {"error": str(e)}
 
@@ -536,43 +873,57 @@ class AgentRunner:
         """Get all active workflows"""
         return list(self.active_workflows.values())
     
+    def _build_agent_dispatch(self) -> Dict[str, Callable[[str, str], Awaitable[Any]]]:
+        """Map agent ids to handlers sharing a (user_input, workflow_id) signature"""
+        # Workflow functions are looked up at call time; some are only defined when the
+        # social media agents imported successfully
+        state = self.active_workflows.__getitem__
+        return {
+            "linkedin_workflow": lambda user_input, workflow_id: self.execute_linkedin_workflow(workflow_id, user_input),
+            "linkedin_ideation": lambda user_input, workflow_id: self._generate_linkedin_ideas(state(workflow_id)),
+            "linkedin_drafting": lambda user_input, workflow_id: self._draft_linkedin_post(state(workflow_id)),
+            "linkedin_publishing": lambda user_input, workflow_id: self._handle_publishing(state(workflow_id), user_input),
+            "youtube_script": lambda user_input, workflow_id: self._run_workflow_function(draft_youtube_script, state(workflow_id)),
+            "youtube_publishing": lambda user_input, workflow_id: self._run_workflow_function(publish_to_linkedin, state(workflow_id)),
+            "content_analysis": lambda user_input, workflow_id: self._run_workflow_function(build_analysis_graph, state(workflow_id)),
+            "sponsorship_agent": lambda user_input, workflow_id: self._run_workflow_function(sponsorship_app.app.run, state(workflow_id)),
+        }
+
     async def run_agent(self, agent_name: str, user_input: str, workflow_id: str) -> str:
         """Run a specific agent with the given input"""
         if agent_name not in self.agents:
             return f"Error: Agent {agent_name} not found"
         
-        agent_config = self.agents[agent_name]
-        print(f"Running agent: {agent_name}")
+        logger.debug("Running agent: %s", agent_name)
         
+        handler = self._agent_dispatch.get(agent_name)
+        if handler is None:
+            return f"Agent {agent_name} not implemented yet"
         try:
-            if agent_name == "linkedin_workflow":
-                return await self.execute_linkedin_workflow(workflow_id, user_input)
-            elif agent_name == "linkedin_ideation":
-                return await self._generate_linkedin_ideas(self.active_workflows[workflow_id])
-            elif agent_name == "linkedin_drafting":
-                return await self._draft_linkedin_post(self.active_workflows[workflow_id])
-            elif agent_name == "linkedin_publishing":
-                return await self._handle_publishing(self.active_workflows[workflow_id], user_input)
-            elif agent_name == "youtube_script":
-                return await self._run_workflow_function(draft_youtube_script, self.active_workflows[workflow_id])
-            elif agent_name == "youtube_publishing":
-                return await self._run_workflow_function(publish_to_linkedin, self.active_workflows[workflow_id])
-            elif agent_name == "content_analysis":
-                return await self._run_workflow_function(build_analysis_graph, self.active_workflows[workflow_id])
-            elif agent_name == "sponsorship_agent":
-                return await self._run_workflow_function(sponsorship_app.app.run, self.active_workflows[workflow_id])
-            else:
-                return f"Agent {agent_name} not implemented yet"
-                
+            return await handler(user_input, workflow_id)
         except Exception as e:
-            error_msg = f"Error running agent {agent_name}: {str(e)}"
-            print(error_msg)
-            return error_msg
+            logger.exception("Error running agent %s", agent_name)
+            return f"Error running agent {agent_name}: {str(e)}"
+    
+    async def run_agents(self, agent_names: List[str], user_input: str, workflow_id: str) -> List[Any]:
+        """Run independent agents concurrently, returning results in agent_names order"""
+        async def _run(agent_name: str):
+            async with self._agent_semaphore:
+                return await self.run_agent(agent_name, user_input, workflow_id)
+        
+        results: Dict[str, Any] = {}
+        # The complete workflow creates the state the other agents read, so it goes first
+        if "linkedin_workflow" in agent_names:
+            results["linkedin_workflow"] = await _run("linkedin_workflow")
+        independent = [name for name in agent_names if name != "linkedin_workflow"]
+        for agent_name, result in zip(independent, await asyncio.gather(*(_run(n) for n in independent))):
+            results[agent_name] = result
+        return [results[name] for name in agent_names]
     
     async def _run_workflow_function(self, func, state):
         """Helper to run workflow functions"""
         try:
-            if asyncio.iscoroutinefunction(func):
+            if _is_coroutine_function(func):
                 result = await func(state)
             else:
                 result = func(state)
@@ -580,14 +931,13 @@ class AgentRunner:
         except Exception as e:
             return {"error": str(e)}
     
-    # Note: synchronous _extract_niche removed to avoid overriding the async version.
-    
     def _extract_idea(self, user_input: str) -> str:
         """Extract content idea from user input"""
         # Simple extraction - could be improved with LLM
-        if "ai" in user_input.lower():
+        text = user_input.lower()
+        if "ai" in text:
             return "AI trends and insights"
-        elif "marketing" in user_input.lower():
+        elif "marketing" in text:
             return "Digital marketing strategies"
         else:
             return "Content creation tips"
@@ -600,49 +950,28 @@ class AgentRunner:
     def _extract_media_url(self, user_input: str) -> str:
         """Extract media URL from user input"""
         # Simple URL extraction
-        url_match = re.search(r'https?://[^\s]+', user_input)
+        url_match = _URL_RE.search(user_input)
         return url_match.group(0) if url_match else None
     
     async def needs_agent_processing(self, message: str) -> bool:
         """Determine if a message needs agent processing"""
         # Simple keyword-based detection
-        agent_keywords = ["analyze", "generate", "create", "post", "publish", "draft"]
-        return any(keyword in message.lower() for keyword in agent_keywords)
+        return not _AGENT_TRIGGER_KEYWORDS.isdisjoint(_keyword_tokens(message))
     
     async def determine_agent(self, message: str) -> str:
         """Determine which agent should process a message"""
-        message_lower = message.lower()
-        
-        if "linkedin" in message_lower:
-            if "idea" in message_lower:
-                return "linkedin_ideation"
-            elif "draft" in message_lower:
-                return "linkedin_drafting"
-            elif "publish" in message_lower:
-                return "linkedin_publishing"
+        tokens = _keyword_tokens(message)
         
-        elif "youtube" in message_lower:
-            if "script" in message_lower:
-                return "youtube_script"
-            elif "publish" in message_lower:
-                return "youtube_publishing"
-        
-        elif "analyze" in message_lower:
-            return "content_analysis"
-        
-        elif "sponsorship" in message_lower:
-            return "sponsorship_agent"
+        for platform, intents in _CHAT_ROUTES:
+            if platform in tokens:
+                for intent, agent_name in intents:
+                    if intent is None or intent in tokens:
+                        return agent_name
+                break
         
         # Default to ideation
         return "linkedin_ideation"
     
-    def get_agent_info(self) -> Dict[str, Dict]:
+    def get_agent_info(self) -> Mapping[str, Dict[str, Any]]:
         """Get information about all available agents"""
-        return {
-            name: {
-                "description": agent.description,
-                "keywords": agent.keywords,
-                "required_params": agent.required_params
-            }
-            for name, agent in self.agents.items()
-        }
+        return _AGENT_INFO
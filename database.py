@@ -1,80 +1,256 @@
+import atexit
+import bisect
 import json
+import logging
 import os
-from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any, Tuple, Callable
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import DefaultDict, Deque, Dict, Iterable, Iterator, List, Optional, Any, Set, Tuple, Callable
 from pathlib import Path
-from models import WorkflowThread, AgentResult, AgentMessage, Workflow
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from models import STATUS_ERROR_PREFIX, WorkflowThread, AgentResult, AgentMessage, Workflow
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+def _dumps(obj: Any, indent: bool = False) -> bytes:
+    """Encode obj as JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        option = orjson.OPT_NAIVE_UTC | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=str, option=option)
+    return json.dumps(obj, indent=2 if indent else None, default=str).encode("utf-8")
+
+def _loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _fsync_dir(path: str) -> None:
+    """fsync the directory holding path so a rename into it survives a crash"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+_WF_FIELDS = frozenset(WorkflowThread.model_fields)
+
+# Built-in templates, built once at import; each DatabaseManager gets its own copies
+_TEMPLATES_CREATED_AT = datetime.now(timezone.utc)
+_DEFAULT_TEMPLATES = {
+    "linkedin_posting": Workflow(
+        id="linkedin_posting_template",
+        name="LinkedIn Posting Workflow",
+        description="Complete workflow for creating and publishing LinkedIn posts",
+        agent_sequence=["linkedin_ideation", "linkedin_drafting", "linkedin_publishing"],
+        created_at=_TEMPLATES_CREATED_AT,
+        metadata={
+            "platform": "linkedin",
+            "category": "social_media",
+            "estimated_time": "5-10 minutes"
+        }
+    ),
+    "youtube_content": Workflow(
+        id="youtube_content_template",
+        name="YouTube Content Creation",
+        description="Workflow for creating YouTube video scripts and publishing",
+        agent_sequence=["youtube_script", "youtube_publishing"],
+        created_at=_TEMPLATES_CREATED_AT,
+        metadata={
+            "platform": "youtube",
+            "category": "video_content",
+            "estimated_time": "15-30 minutes"
+        }
+    ),
+    "content_analysis": Workflow(
+        id="content_analysis_template",
+        name="Content Analysis Workflow",
+        description="Analyze content performance and trends",
+        agent_sequence=["content_analysis"],
+        created_at=_TEMPLATES_CREATED_AT,
+        metadata={
+            "platform": "multi",
+            "category": "analytics",
+            "estimated_time": "2-5 minutes"
+        }
+    )
+}
+
+# Serialize whole collections straight to JSON bytes, without an intermediate dict graph
+_WORKFLOWS_ADAPTER = TypeAdapter(Dict[str, WorkflowThread])
+_AGENT_RESULTS_ADAPTER = TypeAdapter(Dict[str, List[AgentResult]])
+_MESSAGES_ADAPTER = TypeAdapter(Dict[str, Deque[AgentMessage]])
+_TEMPLATES_ADAPTER = TypeAdapter(Dict[str, Workflow])
+# Snapshot section -> (attribute holding the collection, adapter); templates are built in
+# code and never mutated, so their section is encoded once per process
+_SNAPSHOT_ADAPTERS = {
+    "workflows": ("workflows", _WORKFLOWS_ADAPTER),
+    "agent_results": ("agent_results", _AGENT_RESULTS_ADAPTER),
+    "messages": ("messages", _MESSAGES_ADAPTER),
+    "templates": ("workflow_templates", _TEMPLATES_ADAPTER),
+}
+# Sections each mutation log op touches
+_OP_SECTIONS = {
+    "workflow": ("workflows",),
+    "delete": ("workflows", "agent_results", "messages"),
+    "agent_result": ("agent_results",),
+    "message": ("messages",),
+}
+
+class _Snapshot(BaseModel):
+    """Collections of the storage file that are loaded back; other keys are ignored"""
+    # Last mutation log record folded into the snapshot
+    seq: int = 0
+    workflows: Dict[str, WorkflowThread] = {}
+    agent_results: Dict[str, List[AgentResult]] = {}
+    messages: Dict[str, List[AgentMessage]] = {}
+
+# Snapshots with more workflows than this validate them across worker processes
+_PARALLEL_LOAD_THRESHOLD = 1024
+_LOAD_CHUNK_SIZE = 512
+
+# Snapshots larger than this are stream-parsed with ijson when it is installed
+_STREAM_LOAD_BYTES = 64 * 1024 * 1024
+
+def _chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _build_workflows(chunk: List[Tuple[str, Dict[str, Any]]]) -> Tuple[List[Tuple[str, WorkflowThread]], List[str]]:
+    """Validate a chunk of stored workflows; runs in a worker process for large snapshots"""
+    built, errors = [], []
+    for wid, w_data in chunk:
+        try:
+            built.append((wid, WorkflowThread(**w_data)))
+        except Exception as e:
+            errors.append(f"Error loading workflow {wid}: {e}")
+    return built, errors
+
+def _load_workflows(items: List[Tuple[str, Dict[str, Any]]]):
+    if len(items) <= _PARALLEL_LOAD_THRESHOLD:
+        return [_build_workflows(items)]
+    chunks = [items[i:i + _LOAD_CHUNK_SIZE] for i in range(0, len(items), _LOAD_CHUNK_SIZE)]
+    try:
+        with ProcessPoolExecutor() as pool:
+            return list(pool.map(_build_workflows, chunks))
+    except Exception as e:
+        logger.warning("Parallel workflow load failed, loading serially: %s", e)
+        return [_build_workflows(items)]
+
+def _epoch(value: datetime) -> float:
+    # Naive timestamps (datetime.utcnow() callers) are taken as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _search_blob(workflow: WorkflowThread) -> bytes:
+    """Lowercased user input and metadata values, NUL-separated so matches can't span fields"""
+    parts = [workflow.user_input]
+    if workflow.metadata:
+        parts.extend(v if isinstance(v, str) else str(v) for v in workflow.metadata.values())
+    return "\0".join(parts).lower().encode()
+
+def _trigrams(blob: bytes) -> Set[bytes]:
+    return {blob[i:i + 3] for i in range(len(blob) - 2)}
 
 class DatabaseManager:
     """Simple in-memory database manager for workflows"""
     
-    def __init__(self, storage_file: str = "workflow_data.json"):
+    def __init__(self, storage_file: str = "workflow_data.json", flush_interval: float = 0.5,
+                 compact_bytes: int = 4 * 1024 * 1024, max_messages_per_workflow: int = 1000):
         self.storage_file = storage_file
+        # Mutations are appended to this log; it is folded into storage_file once it grows large
+        self.log_file = storage_file + ".log"
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
         self.workflows: Dict[str, WorkflowThread] = {}
         self.workflow_templates: Dict[str, Workflow] = {}
-        self.agent_results: Dict[str, List[AgentResult]] = {}
-        self.messages: Dict[str, List[AgentMessage]] = {}
+        self.agent_results: DefaultDict[str, List[AgentResult]] = defaultdict(list)
+        # Each workflow keeps its most recent max_messages_per_workflow messages
+        self.max_messages_per_workflow = max_messages_per_workflow
+        self.messages: DefaultDict[str, Deque[AgentMessage]] = defaultdict(self._message_log)
         self._subscribers: Dict[str, List[Callable[..., None]]] = {}
+        # Secondary indexes kept in step with self.workflows so stats and category filters
+        # don't scan every workflow
+        self._by_status: Dict[str, Set[str]] = defaultdict(set)
+        self._by_category: Dict[Any, Set[str]] = defaultdict(set)
+        self._index_keys: Dict[str, Tuple[str, Any]] = {}
+        # Agent names with a recorded result, per workflow, for get_next_agent
+        self._executed: DefaultDict[str, Set[str]] = defaultdict(set)
+        self._search_blob: Dict[str, bytes] = {}
+        # Byte trigram -> ids whose blob contains it; narrows substring search to candidates
+        self._trigrams: DefaultDict[bytes, Set[str]] = defaultdict(set)
+        # Serialized snapshot section per collection, re-encoded only once it is dirty again
+        self._snapshot_sections: Dict[str, bytes] = {}
+        self._dirty_sections: Set[str] = set(_SNAPSHOT_ADAPTERS)
+        # (created timestamp, id) kept sorted so cleanup can slice off the expired prefix
+        self._by_created: List[Tuple[float, str]] = []
+        self._created_keys: Dict[str, float] = {}
+        # Execution time of each completed workflow, with a running sum for the stats average
+        self._durations: Dict[str, float] = {}
+        self._duration_total = 0.0
+        # Bumped on every mutation; get_workflow_stats reuses its result while it is unchanged
+        self._stats_version = 0
+        self._stats_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._agent_result_total = 0
+        self._message_total = 0
+        # Mutations queue a log record; a background thread appends them to the log.
+        # _lock guards every mutation and whole-collection walk; single-key reads such as
+        # get_workflow stay lock-free since one dict lookup is atomic under the GIL
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._pending: List[bytes] = []
+        # Sequence number of the last queued record; replay skips records the snapshot holds
+        self._seq = 0
+        self._stop_flusher = threading.Event()
         
         # Load existing data if available
         self.load_data()
         
         # Initialize default templates
         self._initialize_default_templates()
+        
+        self._flusher = threading.Thread(target=self._flush_loop, name="database-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
     
     def _initialize_default_templates(self):
         """Initialize default workflow templates"""
-        default_templates = {
-            "linkedin_posting": Workflow(
-                id="linkedin_posting_template",
-                name="LinkedIn Posting Workflow",
-                description="Complete workflow for creating and publishing LinkedIn posts",
-                agent_sequence=["linkedin_ideation", "linkedin_drafting", "linkedin_publishing"],
-                created_at=datetime.now(timezone.utc),
-                metadata={
-                    "platform": "linkedin",
-                    "category": "social_media",
-                    "estimated_time": "5-10 minutes"
-                }
-            ),
-            "youtube_content": Workflow(
-                id="youtube_content_template",
-                name="YouTube Content Creation",
-                description="Workflow for creating YouTube video scripts and publishing",
-                agent_sequence=["youtube_script", "youtube_publishing"],
-                created_at=datetime.now(timezone.utc),
-                metadata={
-                    "platform": "youtube",
-                    "category": "video_content",
-                    "estimated_time": "15-30 minutes"
-                }
-            ),
-            "content_analysis": Workflow(
-                id="content_analysis_template",
-                name="Content Analysis Workflow",
-                description="Analyze content performance and trends",
-                agent_sequence=["content_analysis"],
-                created_at=datetime.now(timezone.utc),
-                metadata={
-                    "platform": "multi",
-                    "category": "analytics",
-                    "estimated_time": "2-5 minutes"
-                }
-            )
-        }
-        
-        for template_id, template in default_templates.items():
-            self.workflow_templates[template_id] = template
+        self.workflow_templates.update(
+            {tid: template.model_copy(deep=True) for tid, template in _DEFAULT_TEMPLATES.items()}
+        )
     
     def save_workflow(self, workflow: WorkflowThread) -> bool:
         """Save a workflow to storage"""
         try:
-            self.workflows[workflow.id] = workflow
-            self.save_data()
-            self._notify_subscribers(workflow.id, "workflow_saved", workflow.dict())
+            with self._lock:
+                self.workflows[workflow.id] = workflow
+                self._index_workflow(workflow)
+                self._record("workflow", workflow.id, workflow)
+            self._notify_subscribers(workflow.id, "workflow_saved", workflow)
             return True
         except Exception as e:
-            print(f"Error saving workflow: {e}")
+            logger.warning("Error saving workflow: %s", e)
             return False
     
     def get_workflow(self, workflow_id: str) -> Optional[WorkflowThread]:
@@ -91,45 +267,47 @@ class DatabaseManager:
             return False
         
         try:
-            workflow = self.workflows[workflow_id]
-            for key, value in updates.items():
-                if hasattr(workflow, key):
-                    setattr(workflow, key, value)
-            
-            workflow.updated_at = datetime.now(timezone.utc)
-            self.save_data()
+            with self._lock:
+                workflow = self.workflows[workflow_id]
+                for key in updates.keys() & _WF_FIELDS:
+                    setattr(workflow, key, updates[key])
+                
+                workflow.updated_at = datetime.now(timezone.utc)
+                self._index_workflow(workflow)
+                self._record("workflow", workflow_id, workflow)
             self._notify_subscribers(workflow_id, "workflow_updated", updates)
             return True
         except Exception as e:
-            print(f"Error updating workflow: {e}")
+            logger.warning("Error updating workflow: %s", e)
             return False
     
     def delete_workflow(self, workflow_id: str) -> bool:
         """Delete a workflow"""
         try:
-            if workflow_id in self.workflows:
-                del self.workflows[workflow_id]
-            
-            if workflow_id in self.agent_results:
-                del self.agent_results[workflow_id]
-            
-            if workflow_id in self.messages:
-                del self.messages[workflow_id]
-            
-            self.save_data()
+            with self._lock:
+                self._remove_workflow(workflow_id)
             self._notify_subscribers(workflow_id, "workflow_deleted", {"workflow_id": workflow_id})
             return True
         except Exception as e:
-            print(f"Error deleting workflow: {e}")
+            logger.warning("Error deleting workflow: %s", e)
             return False
 
+    def _remove_workflow(self, workflow_id: str) -> None:
+        # Caller holds self._lock
+        self._unindex_workflow(workflow_id)
+        self.workflows.pop(workflow_id, None)
+        self.agent_results.pop(workflow_id, None)
+        self._executed.pop(workflow_id, None)
+        self.messages.pop(workflow_id, None)
+        self._record("delete", workflow_id)
+
     # --- Agent execution helpers ---
     def get_next_agent(self, workflow_id: str) -> Optional[str]:
         """Get the next agent to execute in a workflow"""
         workflow = self.get_workflow(workflow_id)
         if not workflow or not workflow.agents:
             return None
-        executed_agents = {ar.agent_name for ar in self.get_agent_results(workflow_id)}
+        executed_agents = self._executed.get(workflow_id, ())
         for agent in workflow.agents:
             if agent not in executed_agents:
                 return agent
@@ -138,21 +316,23 @@ class DatabaseManager:
     def add_agent_result(self, workflow_id: str, agent_result: AgentResult) -> bool:
         """Add an agent result to a workflow with validation and progression."""
         if workflow_id not in self.workflows:
-            print(f"Error: Workflow {workflow_id} does not exist")
+            logger.warning("Error: Workflow %s does not exist", workflow_id)
             return False
         try:
-            if workflow_id not in self.agent_results:
-                self.agent_results[workflow_id] = []
-            self.agent_results[workflow_id].append(agent_result)
-            # Determine if there is a next agent; if none, mark completed
-            next_agent = self.get_next_agent(workflow_id)
-            if not next_agent:
-                self.update_workflow(workflow_id, {"status": "completed"})
-            self.save_data()
-            self._notify_subscribers(workflow_id, "agent_result", agent_result.dict())
+            with self._lock:
+                self.agent_results[workflow_id].append(agent_result)
+                self._executed[workflow_id].add(agent_result.agent_name)
+                if workflow_id in self._index_keys:
+                    self._agent_result_total += 1
+                # Determine if there is a next agent; if none, mark completed
+                next_agent = self.get_next_agent(workflow_id)
+                self._record("agent_result", workflow_id, agent_result)
+                if not next_agent:
+                    self.update_workflow(workflow_id, {"status": "completed"})
+            self._notify_subscribers(workflow_id, "agent_result", agent_result)
             return True
         except Exception as e:
-            print(f"Error adding agent result: {e}")
+            logger.warning("Error adding agent result: %s", e)
             return False
     
     def get_agent_results(self, workflow_id: str) -> List[AgentResult]:
@@ -162,20 +342,30 @@ class DatabaseManager:
     def add_message(self, workflow_id: str, message: AgentMessage) -> bool:
         """Add a message to a workflow"""
         try:
-            if workflow_id not in self.messages:
-                self.messages[workflow_id] = []
-            
-            self.messages[workflow_id].append(message)
-            self.save_data()
-            self._notify_subscribers(workflow_id, "message", message.dict())
+            with self._lock:
+                log = self.messages[workflow_id]
+                # A full log drops its oldest message, so the total doesn't grow
+                if workflow_id in self._index_keys and len(log) != log.maxlen:
+                    self._message_total += 1
+                log.append(message)
+                self._record("message", workflow_id, message)
+            self._notify_subscribers(workflow_id, "message", message)
             return True
         except Exception as e:
-            print(f"Error adding message: {e}")
+            logger.warning("Error adding message: %s", e)
             return False
     
+    def get_latest_agent_result(self, workflow_id: str) -> Optional[AgentResult]:
+        """Get the most recent agent result for a workflow"""
+        results = self.agent_results.get(workflow_id)
+        return results[-1] if results else None
+    
+    def _message_log(self, messages: Iterable[AgentMessage] = ()) -> Deque[AgentMessage]:
+        return deque(messages, maxlen=self.max_messages_per_workflow)
+    
     def get_messages(self, workflow_id: str) -> List[AgentMessage]:
         """Get all messages for a workflow"""
-        return self.messages.get(workflow_id, [])
+        return list(self.messages.get(workflow_id, ()))
     
     def get_workflow_templates(self) -> List[Workflow]:
         """Get all available workflow templates"""
@@ -192,11 +382,12 @@ class DatabaseManager:
             return None
         
         try:
+            now = datetime.now(timezone.utc)
             workflow = WorkflowThread(
-                id=f"workflow_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}",
+                id=f"workflow_{now.strftime('%Y%m%d_%H%M%S')}",
                 user_input=user_input,
                 status="created",
-                created_at=datetime.now(timezone.utc),
+                created_at=now,
                 agents=template.agent_sequence.copy(),
                 messages=[],
                 agent_results=[],
@@ -210,57 +401,67 @@ class DatabaseManager:
             self.save_workflow(workflow)
             return workflow
         except Exception as e:
-            print(f"Error creating workflow from template: {e}")
+            logger.warning("Error creating workflow from template: %s", e)
             return None
     
     def search_workflows(self, query: str, category: Optional[str] = None) -> List[WorkflowThread]:
         """Search workflows by query and category"""
-        results = []
-        query_lower = query.lower()
-        
-        for workflow in self.workflows.values():
-            # Check if query matches user input or metadata
-            if (query_lower in workflow.user_input.lower() or
-                (workflow.metadata and 
-                 any(query_lower in str(value).lower() for value in workflow.metadata.values()))):
-                
-                # Filter by category if specified
-                if category is None or (workflow.metadata and 
-                                      workflow.metadata.get("category") == category):
-                    results.append(workflow)
-        
-        return results
+        needle = query.lower().encode()
+        blobs = self._search_blob
+        with self._lock:
+            if len(needle) >= 3:
+                # A blob can only contain the query if it contains every trigram of it
+                postings = sorted((self._trigrams.get(gram, ()) for gram in _trigrams(needle)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+                if category is not None:
+                    candidates &= self._by_category.get(category, set())
+            elif category is None:
+                candidates = blobs.keys()
+            else:
+                candidates = self._by_category.get(category, ())
+            
+            # Bytes containment runs in C; the blob already holds user input and metadata values
+            return [self.workflows[wid] for wid in candidates if needle in blobs[wid]]
+    
+    def get_workflows_by_status(self, status: str) -> List[WorkflowThread]:
+        """Get all workflows currently in the given status"""
+        with self._lock:
+            return [self.workflows[wid] for wid in self._by_status.get(status, ())]
     
     def get_workflow_stats(self) -> Dict[str, Any]:
         """Get statistics about workflows"""
-        total_workflows = len(self.workflows)
-        completed_workflows = sum(1 for w in self.workflows.values() if w.status == "completed")
-        processing_workflows = sum(1 for w in self.workflows.values() if w.status == "processing")
-        error_workflows = sum(1 for w in self.workflows.values() if "error" in w.status)
+        cached = self._stats_cache
+        if cached is not None and cached[0] == self._stats_version:
+            return dict(cached[1])
+        # The status index is walked as a whole, so hold _lock like any other collection walk
+        with self._lock:
+            version = self._stats_version
+            total_workflows = len(self.workflows)
+            completed_ids = self._by_status.get("completed", ())
+            completed_workflows = len(completed_ids)
+            processing_workflows = len(self._by_status.get("processing", ()))
+            error_workflows = sum(len(ids) for status, ids in self._by_status.items() if status.startswith(STATUS_ERROR_PREFIX))
         
-        total_agents_run = sum(len(self.agent_results.get(w.id, [])) for w in self.workflows.values())
-        total_messages = sum(len(self.messages.get(w.id, [])) for w in self.workflows.values())
-        
-        # Calculate average execution time (if available)
-        execution_times = []
-        for workflow in self.workflows.values():
-            if workflow.status == "completed" and workflow.updated_at:
-                duration = (workflow.updated_at - workflow.created_at).total_seconds()
-                execution_times.append(duration)
+            total_agents_run = self._agent_result_total
+            total_messages = self._message_total
         
-        avg_execution_time = sum(execution_times) / len(execution_times) if execution_times else 0
+            # Average execution time over completed workflows that have an updated_at
+            timed = len(self._durations)
+            avg_execution_time = self._duration_total / timed if timed else 0
         
-        return {
-            "total_workflows": total_workflows,
-            "completed_workflows": completed_workflows,
-            "processing_workflows": processing_workflows,
-            "error_workflows": error_workflows,
-            "total_agents_run": total_agents_run,
-            "total_messages": total_messages,
-            "success_rate": (completed_workflows / total_workflows * 100) if total_workflows > 0 else 0,
-            "average_execution_time": avg_execution_time,
-            "templates_available": len(self.workflow_templates)
-        }
+            stats = {
+                "total_workflows": total_workflows,
+                "completed_workflows": completed_workflows,
+                "processing_workflows": processing_workflows,
+                "error_workflows": error_workflows,
+                "total_agents_run": total_agents_run,
+                "total_messages": total_messages,
+                "success_rate": (completed_workflows / total_workflows * 100) if total_workflows > 0 else 0,
+                "average_execution_time": avg_execution_time,
+                "templates_available": len(self.workflow_templates)
+            }
+            self._stats_cache = (version, stats)
+        return dict(stats)
 
     # --- Validation ---
     def validate_workflow_data(self, workflow_data: Dict[str, Any]) -> Tuple[bool, str]:
@@ -277,12 +478,14 @@ class DatabaseManager:
 
     # --- Backup & Restore ---
     def _get_all_data(self) -> Dict[str, Any]:
-        return {
-            "workflows": {wid: w.dict() for wid, w in self.workflows.items()},
-            "agent_results": {wid: [ar.model_dump() for ar in ars] for wid, ars in self.agent_results.items()},
-            "messages": {wid: [m.dict() for m in msgs] for wid, msgs in self.messages.items()},
-            "templates": {tid: t.dict() for tid, t in self.workflow_templates.items()},
-        }
+        # Held so a concurrent mutation can't resize a dict mid-iteration
+        with self._lock:
+            return {
+                "workflows": {wid: w.dict() for wid, w in self.workflows.items()},
+                "agent_results": {wid: [ar.model_dump() for ar in ars] for wid, ars in self.agent_results.items()},
+                "messages": {wid: [m.dict() for m in msgs] for wid, msgs in self.messages.items()},
+                "templates": {tid: t.dict() for tid, t in self.workflow_templates.items()},
+            }
 
     def create_backup(self, backup_path: str) -> bool:
         try:
@@ -290,35 +493,38 @@ class DatabaseManager:
             backup_dir.mkdir(parents=True, exist_ok=True)
             timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
             backup_file = backup_dir / f"workflow_backup_{timestamp}.json"
-            with backup_file.open('w', encoding='utf-8') as f:
-                json.dump(self._get_all_data(), f, indent=2, default=str)
-            print(f"Backup created: {backup_file}")
+            with backup_file.open('wb') as f:
+                f.write(_dumps(self._get_all_data(), indent=True))
+            logger.info("Backup created: %s", backup_file)
             return True
         except Exception as e:
-            print(f"Error creating backup: {e}")
+            logger.warning("Error creating backup: %s", e)
             return False
 
     def restore_from_backup(self, backup_file: str) -> bool:
         try:
             if not os.path.exists(backup_file):
-                print(f"Backup file not found: {backup_file}")
+                logger.warning("Backup file not found: %s", backup_file)
                 return False
-            with open(backup_file, 'r', encoding='utf-8') as f:
-                backup_data = json.load(f)
-            self.workflows.clear()
-            self.agent_results.clear()
-            self.messages.clear()
-            for wid, w_data in backup_data.get("workflows", {}).items():
-                self.workflows[wid] = WorkflowThread(**w_data)
-            for wid, ar_data in backup_data.get("agent_results", {}).items():
-                self.agent_results[wid] = [AgentResult(**ar) for ar in ar_data]
-            for wid, msg_data in backup_data.get("messages", {}).items():
-                self.messages[wid] = [AgentMessage(**msg) for msg in msg_data]
-            print(f"Restored from backup: {backup_file}")
+            with open(backup_file, 'rb') as f:
+                backup_data = _loads(f.read())
+            with self._lock:
+                self.workflows.clear()
+                self.agent_results.clear()
+                self.messages.clear()
+                for wid, w_data in backup_data.get("workflows", {}).items():
+                    self.workflows[wid] = WorkflowThread(**w_data)
+                for wid, ar_data in backup_data.get("agent_results", {}).items():
+                    self.agent_results[wid] = [AgentResult(**ar) for ar in ar_data]
+                for wid, msg_data in backup_data.get("messages", {}).items():
+                    self.messages[wid] = self._message_log(AgentMessage(**msg) for msg in msg_data)
+                self._rebuild_indexes()
+                self._dirty_sections.update(_SNAPSHOT_ADAPTERS)
+            logger.info("Restored from backup: %s", backup_file)
             self.save_data()
             return True
         except Exception as e:
-            print(f"Error restoring from backup: {e}")
+            logger.warning("Error restoring from backup: %s", e)
             return False
 
     # --- Export / Import ---
@@ -332,21 +538,21 @@ class DatabaseManager:
                 "agent_results": [ar.model_dump() for ar in self.get_agent_results(workflow_id)],
                 "messages": [m.dict() for m in self.get_messages(workflow_id)]
             }
-            with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, default=str)
-            print(f"Exported workflow {workflow_id} to {export_path}")
+            with open(export_path, 'wb') as f:
+                f.write(_dumps(export_data, indent=True))
+            logger.info("Exported workflow %s to %s", workflow_id, export_path)
             return True
         except Exception as e:
-            print(f"Error exporting workflow: {e}")
+            logger.warning("Error exporting workflow: %s", e)
             return False
 
     def import_workflow(self, import_path: str) -> Optional[str]:
         try:
             if not os.path.exists(import_path):
-                print(f"Import file not found: {import_path}")
+                logger.warning("Import file not found: %s", import_path)
                 return None
-            with open(import_path, 'r', encoding='utf-8') as f:
-                import_data = json.load(f)
+            with open(import_path, 'rb') as f:
+                import_data = _loads(f.read())
             workflow_data = import_data["workflow"]
             new_workflow_id = f"imported_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}"
             workflow_data["id"] = new_workflow_id
@@ -358,88 +564,315 @@ class DatabaseManager:
             for msg_data in import_data.get("messages", []):
                 message = AgentMessage(**msg_data)
                 self.add_message(new_workflow_id, message)
-            print(f"Imported workflow as {new_workflow_id}")
+            logger.info("Imported workflow as %s", new_workflow_id)
             return new_workflow_id
         except Exception as e:
-            print(f"Error importing workflow: {e}")
+            logger.warning("Error importing workflow: %s", e)
             return None
 
     # --- Realtime subscription ---
     def subscribe_to_updates(self, workflow_id: str, callback: Callable[[str, Any], None]) -> None:
-        if workflow_id not in self._subscribers:
-            self._subscribers[workflow_id] = []
-        self._subscribers[workflow_id].append(callback)
+        with self._lock:
+            self._subscribers.setdefault(workflow_id, []).append(callback)
 
     def _notify_subscribers(self, workflow_id: str, event_type: str, data: Any) -> None:
-        for cb in self._subscribers.get(workflow_id, []):
+        subscribers = self._subscribers.get(workflow_id)
+        if not subscribers:
+            return
+        # Models are only dumped once someone is listening
+        if isinstance(data, BaseModel):
+            data = data.model_dump()
+        # Iterate a snapshot so a callback that subscribes doesn't extend this loop
+        for cb in tuple(subscribers):
             try:
                 cb(event_type, data)
             except Exception as e:
-                print(f"Error in subscriber callback: {e}")
+                logger.warning("Error in subscriber callback: %s", e)
+    
+    # --- Secondary indexes (callers hold self._lock) ---
+    def _index_workflow(self, workflow: WorkflowThread) -> None:
+        wid = workflow.id
+        old = self._index_keys.get(wid)
+        if old is None:
+            self._agent_result_total += len(self.agent_results.get(wid, ()))
+            self._message_total += len(self.messages.get(wid, ()))
+        else:
+            self._discard_index_keys(wid, old)
+        status = workflow.status
+        category = workflow.metadata.get("category") if workflow.metadata else None
+        self._by_status[status].add(wid)
+        if category is not None:
+            self._by_category[category].add(wid)
+        self._index_keys[wid] = (status, category)
+        blob = _search_blob(workflow)
+        old_blob = self._search_blob.get(wid)
+        if blob != old_blob:
+            if old_blob is not None:
+                self._discard_trigrams(wid, old_blob)
+            for gram in _trigrams(blob):
+                self._trigrams[gram].add(wid)
+            self._search_blob[wid] = blob
+        created = _epoch(workflow.created_at)
+        old_created = self._created_keys.get(wid)
+        if old_created != created:
+            if old_created is not None:
+                self._discard_created(wid, old_created)
+            bisect.insort(self._by_created, (created, wid))
+            self._created_keys[wid] = created
+        self._duration_total -= self._durations.pop(wid, 0.0)
+        if status == "completed" and workflow.updated_at:
+            duration = _epoch(workflow.updated_at) - created
+            self._durations[wid] = duration
+            self._duration_total += duration
+
+    def _unindex_workflow(self, wid: str) -> None:
+        old = self._index_keys.pop(wid, None)
+        if old is None:
+            return
+        self._discard_index_keys(wid, old)
+        old_blob = self._search_blob.pop(wid, None)
+        if old_blob is not None:
+            self._discard_trigrams(wid, old_blob)
+        old_created = self._created_keys.pop(wid, None)
+        if old_created is not None:
+            self._discard_created(wid, old_created)
+        self._duration_total -= self._durations.pop(wid, 0.0)
+        self._agent_result_total -= len(self.agent_results.get(wid, ()))
+        self._message_total -= len(self.messages.get(wid, ()))
+
+    def _discard_index_keys(self, wid: str, keys: Tuple[str, Any]) -> None:
+        status, category = keys
+        for index, key in ((self._by_status, status), (self._by_category, category)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(wid)
+                if not ids:
+                    del index[key]
+
+    def _discard_trigrams(self, wid: str, blob: bytes) -> None:
+        for gram in _trigrams(blob):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(wid)
+                if not ids:
+                    del self._trigrams[gram]
+
+    def _discard_created(self, wid: str, created: float) -> None:
+        i = bisect.bisect_left(self._by_created, (created, wid))
+        if i < len(self._by_created) and self._by_created[i] == (created, wid):
+            del self._by_created[i]
+
+    def _rebuild_indexes(self) -> None:
+        self._by_status.clear()
+        self._by_category.clear()
+        self._index_keys.clear()
+        self._search_blob.clear()
+        self._trigrams.clear()
+        self._by_created.clear()
+        self._created_keys.clear()
+        self._durations.clear()
+        self._duration_total = 0.0
+        self._stats_version += 1
+        self._agent_result_total = 0
+        self._message_total = 0
+        self._executed.clear()
+        for wid, results in self.agent_results.items():
+            self._executed[wid].update(ar.agent_name for ar in results)
+        for workflow in self.workflows.values():
+            self._index_workflow(workflow)
+
+    def _record(self, op: str, workflow_id: str, payload: Optional[BaseModel] = None) -> None:
+        """Queue one mutation for the append-only log"""
+        # The model serializes itself straight to JSON bytes, skipping a model_dump() dict
+        body = payload.model_dump_json().encode() if payload is not None else b"null"
+        with self._lock:
+            self._seq += 1
+            record = b"".join((
+                b'{"n":', str(self._seq).encode(), b',"op":"', op.encode(),
+                b'","wid":', _dumps(workflow_id), b',"payload":', body, b"}\n",
+            ))
+            self._pending.append(record)
+            self._dirty_sections.update(_OP_SECTIONS[op])
+            self._stats_version += 1
+
+    def _apply_record(self, record: Dict[str, Any]) -> None:
+        op, wid, payload = record["op"], record["wid"], record.get("payload")
+        if op == "workflow":
+            self.workflows[wid] = WorkflowThread(**payload)
+        elif op == "delete":
+            self.workflows.pop(wid, None)
+            self.agent_results.pop(wid, None)
+            self.messages.pop(wid, None)
+        elif op == "agent_result":
+            self.agent_results[wid].append(AgentResult(**payload))
+        elif op == "message":
+            self.messages[wid].append(AgentMessage(**payload))
+
+    def _flush_loop(self) -> None:
+        while not self._stop_flusher.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Append pending mutations to the log, compacting it into a snapshot once it is large"""
+        with self._write_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            if not records:
+                return
+            try:
+                with open(self.log_file, 'ab') as f:
+                    f.write(b"".join(records))
+                needs_snapshot = os.path.getsize(self.log_file) > self.compact_bytes
+            except Exception as e:
+                with self._lock:
+                    self._pending[:0] = records
+                logger.warning("Error writing mutation log: %s", e)
+                return
+            if needs_snapshot:
+                self._write_snapshot()
+
+    def close(self) -> None:
+        """Stop the background writer and flush anything still pending"""
+        self._stop_flusher.set()
+        self.flush()
     
     def save_data(self):
-        """Save data to storage file"""
+        """Write a full snapshot to the storage file and reset the mutation log"""
+        with self._write_lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        # Caller holds _write_lock. Pending records are already reflected in memory, so the
+        # snapshot supersedes them along with everything in the log
+        with self._lock:
+            drained, self._pending = self._pending, []
+            sections = self._snapshot_sections
+            for name in self._dirty_sections:
+                attr, adapter = _SNAPSHOT_ADAPTERS[name]
+                sections[name] = adapter.dump_json(getattr(self, attr))
+            self._dirty_sections.clear()
+            # seq leads so a streaming load reads it without scanning the collections
+            payload = b"".join((
+                b'{"seq":', str(self._seq).encode(),
+                b',"workflows":', sections["workflows"],
+                b',"agent_results":', sections["agent_results"],
+                b',"messages":', sections["messages"],
+                b',"templates":', sections["templates"],
+                b',"last_updated":', _dumps(datetime.now(timezone.utc).isoformat()),
+                b'}',
+            ))
         try:
-            data = {
-                "workflows": {wid: w.dict() for wid, w in self.workflows.items()},
-                "agent_results": {wid: [ar.model_dump() for ar in ars] for wid, ars in self.agent_results.items()},
-                "messages": {wid: [m.dict() for m in msgs] for wid, msgs in self.messages.items()},
-                "templates": {tid: t.dict() for tid, t in self.workflow_templates.items()},
-                "last_updated": datetime.now(timezone.utc).isoformat()
-            }
-            
-            with open(self.storage_file, 'w') as f:
-                json.dump(data, f, indent=2, default=str)
-                
+            tmp_file = self.storage_file + ".tmp"
+            # One unbuffered write path for the whole payload rather than buffered file chunks
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(fd, view):]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp_file, self.storage_file)
+            _fsync_dir(self.storage_file)
+            open(self.log_file, 'wb').close()
         except Exception as e:
-            print(f"Error saving data: {e}")
+            with self._lock:
+                self._pending[:0] = drained
+            logger.warning("Error saving data: %s", e)
     
     def load_data(self):
-        """Load data from storage file"""
+        """Load the storage file snapshot, then replay the mutation log on top of it"""
         try:
             if os.path.exists(self.storage_file):
-                with open(self.storage_file, 'r') as f:
-                    data = json.load(f)
-                
-                # Load workflows
-                for wid, w_data in data.get("workflows", {}).items():
-                    try:
-                        workflow = WorkflowThread(**w_data)
-                        self.workflows[wid] = workflow
-                    except Exception as e:
-                        print(f"Error loading workflow {wid}: {e}")
-                
-                # Load agent results
-                for wid, ar_data in data.get("agent_results", {}).items():
-                    try:
-                        self.agent_results[wid] = [AgentResult(**ar) for ar in ar_data]
-                    except Exception as e:
-                        print(f"Error loading agent results for {wid}: {e}")
-                
-                # Load messages
-                for wid, msg_data in data.get("messages", {}).items():
-                    try:
-                        self.messages[wid] = [AgentMessage(**msg) for msg in msg_data]
-                    except Exception as e:
-                        print(f"Error loading messages for {wid}: {e}")
-                
-                print(f"Loaded {len(self.workflows)} workflows from storage")
+                with open(self.storage_file, 'rb') as f:
+                    if ijson is not None and os.path.getsize(self.storage_file) > _STREAM_LOAD_BYTES:
+                        # Stream big snapshots section by section instead of holding the whole
+                        # parsed document alongside the models built from it
+                        def section(name):
+                            f.seek(0)
+                            return ijson.kvitems(f, name, use_float=True)
+                        self._seq = next(ijson.items(f, "seq"), 0)
+                        self._load_snapshot(section, streaming=True)
+                    else:
+                        raw = f.read()
+                        try:
+                            # Our own snapshot: parse and build every model in one pydantic-core pass
+                            snapshot = _Snapshot.model_validate_json(raw)
+                        except ValidationError as e:
+                            logger.warning("Snapshot failed bulk validation, loading it item by item: %s", e)
+                            data = _loads(raw)
+                            self._seq = data.get("seq", 0)
+                            self._load_snapshot(lambda name: data.get(name, {}).items(), streaming=False)
+                        else:
+                            self._seq = snapshot.seq
+                            self.workflows.update(snapshot.workflows)
+                            self.agent_results.update(snapshot.agent_results)
+                            for wid, msgs in snapshot.messages.items():
+                                self.messages[wid] = self._message_log(msgs)
+            
+            if os.path.exists(self.log_file):
+                snapshot_seq = self._seq
+                with open(self.log_file, 'rb') as f:
+                    for line in f:
+                        try:
+                            record = _loads(line)
+                            seq = record.get("n")
+                            if seq is not None:
+                                # Already folded into the snapshot: a crash between replacing
+                                # the snapshot and truncating the log left it behind
+                                if seq <= snapshot_seq:
+                                    continue
+                                self._seq = max(self._seq, seq)
+                            self._apply_record(record)
+                        except Exception as e:
+                            # A torn final line from a crash mid-append is skipped
+                            logger.warning("Error replaying mutation log record: %s", e)
+            
+            self._rebuild_indexes()
+            logger.info("Loaded %s workflows from storage", len(self.workflows))
                 
         except Exception as e:
-            print(f"Error loading data: {e}")
+            logger.warning("Error loading data: %s", e)
+    
+    def _load_snapshot(self, section: Callable[[str], Any], streaming: bool) -> None:
+        # section(name) yields (id, raw) pairs; each is consumed fully before the next is opened
+        workflows = section("workflows")
+        if streaming:
+            batches = (_build_workflows(chunk) for chunk in _chunked(workflows, _LOAD_CHUNK_SIZE))
+        else:
+            batches = _load_workflows(list(workflows))
+        for built, errors in batches:
+            self.workflows.update(built)
+            for error in errors:
+                logger.warning("%s", error)
+        
+        for wid, ar_data in section("agent_results"):
+            try:
+                self.agent_results[wid] = [AgentResult(**ar) for ar in ar_data]
+            except Exception as e:
+                logger.warning("Error loading agent results for %s: %s", wid, e)
+        
+        for wid, msg_data in section("messages"):
+            try:
+                self.messages[wid] = self._message_log(AgentMessage(**msg) for msg in msg_data)
+            except Exception as e:
+                logger.warning("Error loading messages for %s: %s", wid, e)
     
     def cleanup_old_data(self, days_old: int = 30):
         """Clean up old workflow data"""
-        cutoff_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        cutoff_date = cutoff_date.replace(day=cutoff_date.day - days_old)
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days_old)).timestamp()
         
-        workflows_to_delete = []
-        for workflow_id, workflow in self.workflows.items():
-            if workflow.created_at < cutoff_date:
-                workflows_to_delete.append(workflow_id)
+        with self._lock:
+            # Everything created before the cutoff is a prefix of the sorted index
+            stop = bisect.bisect_left(self._by_created, (cutoff,))
+            workflows_to_delete = [wid for _, wid in self._by_created[:stop]]
+            del self._by_created[:stop]
+            for workflow_id in workflows_to_delete:
+                del self._created_keys[workflow_id]
+                self._remove_workflow(workflow_id)
         
         for workflow_id in workflows_to_delete:
-            self.delete_workflow(workflow_id)
+            self._notify_subscribers(workflow_id, "workflow_deleted", {"workflow_id": workflow_id})
         
-        print(f"Cleaned up {len(workflows_to_delete)} old workflows")
+        logger.info("Cleaned up %s old workflows", len(workflows_to_delete))
         self.save_data()
@@ -136,8 +136,10 @@ export const WorkflowProvider: React.FC<{ children: ReactNode }> = ({ children }
       dispatch({ type: 'ADD_AGENT_RESULT', payload: data });
     });
 
-    newSocket.on('workflow_message', (data) => {
-      dispatch({ type: 'ADD_MESSAGE', payload: data });
+    newSocket.on('workflow_messages', (data) => {
+      for (const message of data.messages) {
+        dispatch({ type: 'ADD_MESSAGE', payload: { workflow_id: data.workflow_id, message } });
+      }
     });
 
     return () => {
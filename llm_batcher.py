@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+class LLMBatcher:
+    """Coalesces LLM calls that arrive within a short window and fans them out concurrently"""
+
+    def __init__(self, max_batch: int = 32, max_wait_ms: float = 10, max_concurrency: int = 16):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._server_task: Optional[asyncio.Task] = None
+        self._batch_tasks: Set[asyncio.Task] = set()
+
+    def _ensure_started(self) -> None:
+        # Started lazily: AgentRunner is built at import time, before any event loop runs
+        if self._server_task is None or self._server_task.done():
+            self._queue = asyncio.Queue()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._server_task = asyncio.create_task(self._server_loop())
+
+    async def submit(self, chain, inputs: Dict[str, Any]) -> Any:
+        """Queue chain.ainvoke(inputs) for the next batch and wait for its result"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((chain, inputs, future))
+        return await future
+
+    async def _server_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Run the batch in the background so the next window can fill meanwhile
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch) -> None:
+        await asyncio.gather(*(self._dispatch(*item) for item in batch))
+
+    async def _dispatch(self, chain, inputs: Dict[str, Any], future: asyncio.Future) -> None:
+        if future.done():
+            return
+        async with self._semaphore:
+            try:
+                result = await chain.ainvoke(inputs)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+        if not future.done():
+            future.set_result(result)
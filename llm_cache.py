@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import math
+import re
+import sqlite3
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({
+    "a", "an", "and", "about", "for", "in", "into", "of", "on", "or",
+    "the", "to", "with", "my", "me", "i", "please", "some",
+})
+# Weights are stored as int8-range integers with a fixed 1/127 scale; ints below 257 are
+# interned by CPython, so entries hold no per-weight float objects
+_QUANT_SCALE = 127
+
+def _tokens(text: str) -> List[str]:
+    """Lowercase non-stopword tokens of text, in order"""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+def _embed(tokens: List[str]) -> Dict[str, int]:
+    """Return a unit-length vector of tokens and adjacent token pairs, quantized to 1..127"""
+    # Pairs make word order count: "dogs bite men" and "men bite dogs" share no pair
+    counts = Counter(tokens)
+    counts.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    norm = math.sqrt(sum(c * c for c in counts.values()))
+    if not norm:
+        return {}
+    return {token: max(1, round(count / norm * _QUANT_SCALE)) for token, count in counts.items()}
+
+def _cache_key(tokens: List[str]) -> str:
+    """Exact key: the normalized token sequence, so word order and repeats still count"""
+    return " ".join(tokens)
+
+class SemanticCache:
+    """Two-tier LLM output cache: an LRU working set (MTM) backed by a durable SQLite store (LTM)"""
+
+    def __init__(self, threshold: float = 0.87, max_entries: int = 512,
+                 ltm_path: Optional[str] = ".llm_cache.db", promote_every: int = 50,
+                 promote_top_k: int = 16, exact_namespaces: Iterable[str] = ()):
+        self.threshold = threshold
+        # Namespaces answered only by an exact key match; similarity cannot tell a paraphrase
+        # from a prompt that differs by one meaning-changing word
+        self.exact_namespaces = frozenset(exact_namespaces)
+        self._int_threshold = threshold * _QUANT_SCALE * _QUANT_SCALE
+        self.max_entries = max_entries
+        self.promote_every = promote_every
+        self.promote_top_k = promote_top_k
+        # namespace -> key -> (embedding, value); namespaces keep call sites apart
+        self._mtm: Dict[str, "OrderedDict[str, Tuple[Dict[str, int], Any]]"] = {}
+        # namespace -> token -> keys containing it; only entries sharing a token can score > 0
+        self._postings: Dict[str, Dict[str, Set[str]]] = {}
+        self._freq: Counter = Counter()
+        self._inserts = 0
+        self._ltm: Optional[sqlite3.Connection] = None
+        # Every LTM query runs on this one thread: off the event loop, and serialized on the
+        # shared connection
+        self._ltm_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache-ltm")
+        if ltm_path:
+            try:
+                self._ltm = sqlite3.connect(ltm_path, check_same_thread=False)
+                self._ltm.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "namespace TEXT, prompt TEXT, response TEXT, freq INTEGER, "
+                    "PRIMARY KEY (namespace, prompt))"
+                )
+            except sqlite3.Error as e:
+                logger.error("Error opening LLM cache store: %s", e)
+                self._ltm = None
+
+    async def lookup(self, namespace: str, text: str) -> Optional[Any]:
+        """Return the cached value for text: MTM exact, then MTM semantic, then LTM"""
+        tokens = _tokens(text)
+        if not tokens:
+            return None
+        key = _cache_key(tokens)
+        query = _embed(tokens)
+        entries = self._mtm.get(namespace)
+        if entries:
+            if key not in entries and namespace not in self.exact_namespaces:
+                best_key, best_score = self._best_match(namespace, query)
+                if best_score >= self._int_threshold:
+                    key = best_key
+            if key in entries:
+                entries.move_to_end(key)
+                self._freq[(namespace, key)] += 1
+                return entries[key][1]
+        if self._ltm is None:
+            return None
+        value = await asyncio.get_running_loop().run_in_executor(
+            self._ltm_executor, self._ltm_get, namespace, key)
+        if value is not None:
+            self._put(namespace, key, query, value)
+        return value
+
+    def store(self, namespace: str, text: str, value: Any) -> None:
+        """Remember value as the LLM output for text"""
+        tokens = _tokens(text)
+        if not tokens:
+            return
+        self._put(namespace, _cache_key(tokens), _embed(tokens), value)
+        self._inserts += 1
+        if self._inserts % self.promote_every == 0:
+            self._promote()
+
+    def _best_match(self, namespace: str, query: Dict[str, int]) -> Tuple[Optional[str], int]:
+        """Integer dot product over the postings of the query's tokens, then argmax"""
+        entries = self._mtm[namespace]
+        postings = self._postings.get(namespace, {})
+        scores: Dict[str, int] = {}
+        for token, weight in query.items():
+            for key in postings.get(token, ()):
+                scores[key] = scores.get(key, 0) + weight * entries[key][0][token]
+        if not scores:
+            return None, 0
+        best_key = max(scores, key=scores.__getitem__)
+        return best_key, scores[best_key]
+
+    def _put(self, namespace: str, key: str, vector: Dict[str, int], value: Any) -> None:
+        entries = self._mtm.setdefault(namespace, OrderedDict())
+        postings = self._postings.setdefault(namespace, {})
+        entries[key] = (vector, value)
+        entries.move_to_end(key)
+        if namespace not in self.exact_namespaces:
+            for token in vector:
+                postings.setdefault(token, set()).add(key)
+        self._freq[(namespace, key)] += 1
+        if len(entries) > self.max_entries:
+            evicted, (evicted_vector, _) = entries.popitem(last=False)
+            for token in evicted_vector:
+                keys = postings.get(token)
+                if keys is not None:
+                    keys.discard(evicted)
+                    if not keys:
+                        del postings[token]
+            self._freq.pop((namespace, evicted), None)
+
+    def _promote(self) -> None:
+        """Queue the most frequently used MTM entries for writing into the LTM"""
+        if self._ltm is None:
+            return
+        # Rows are gathered here on the loop, which owns the MTM; only the write is handed off
+        rows = []
+        for (namespace, key), freq in self._freq.most_common(self.promote_top_k):
+            entry = self._mtm.get(namespace, {}).get(key)
+            if entry is None:
+                continue
+            try:
+                rows.append((namespace, key, json.dumps(entry[1]), freq))
+            except (TypeError, ValueError):
+                continue
+        if rows:
+            self._ltm_executor.submit(self._ltm_put, rows)
+
+    def _ltm_put(self, rows: List[Tuple[str, str, str, int]]) -> None:
+        try:
+            with self._ltm:
+                self._ltm.executemany("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.error("Error promoting LLM cache entries: %s", e)
+
+    def _ltm_get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            row = self._ltm.execute(
+                "SELECT response FROM llm_cache WHERE namespace = ? AND prompt = ?", (namespace, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error("Error reading LLM cache store: %s", e)
+            return None
+        return json.loads(row[0]) if row else None
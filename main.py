@@ -1,5 +1,10 @@
 import asyncio
+import atexit
 import json
+import logging
+import logging.handlers
+import os
+import queue
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional, Set
@@ -7,29 +12,88 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response
 import socketio
 from pydantic import BaseModel
 import uvicorn
 
-from workflow_manager import WorkflowManager
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from workflow_manager import AgentFlag, WorkflowManager
 from agent_runner import AgentRunner
 from database import DatabaseManager
-from models import Workflow, WorkflowThread, AgentMessage, UserInput
+from models import STATUS_ERROR_PREFIX, Workflow, WorkflowThread, AgentMessage, UserInput
+
+def _configure_logging() -> None:
+    """Route records through a queue so the event loop never blocks on a stdout write"""
+    if logging.getLogger().handlers:
+        return
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The listener's handler applies the real format; the queued record carries just the message
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[queue_handler])
+    listener.start()
+    atexit.register(listener.stop)
+
+_configure_logging()
+logger = logging.getLogger(__name__)
+
+# Also emit one 'workflow_message' event per message, for clients that predate 'workflow_messages'.
+# On by default: the checked-in frontend/build bundle only listens for 'workflow_message'
+LEGACY_MESSAGE_EVENTS = os.getenv("LEGACY_WORKFLOW_MESSAGE_EVENTS", "1").lower() in ("1", "true", "yes")
 
 # Global managers
 workflow_manager = WorkflowManager()
 agent_runner = AgentRunner()
 db_manager = DatabaseManager()
 
+class _OrjsonPackets:
+    """json-module shim so Socket.IO packets are encoded by orjson; the kwargs socketio passes
+    (separators) only matter for stdlib json, orjson output is already compact"""
+
+    @staticmethod
+    def dumps(obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NAIVE_UTC).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
 # Socket.IO server
-sio = socketio.AsyncServer(cors_allowed_origins="*", async_mode='asgi')
+# With REDIS_URL set, emits go through Redis pub/sub so every worker reaches its own clients
+REDIS_URL = os.getenv("REDIS_URL")
+sio = socketio.AsyncServer(
+    cors_allowed_origins="*",
+    async_mode='asgi',
+    json=_OrjsonPackets if orjson else json,
+    client_manager=socketio.AsyncRedisManager(REDIS_URL) if REDIS_URL else None
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await agent_runner.result_cache.connect()
+    yield
+    await agent_runner.result_cache.close()
 
 # FastAPI app
 app = FastAPI(
     title="Creator Workflow AI",
     description="A Lindy AI-like platform for creators with workflow management and agent automation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -40,15 +104,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Message/idea payloads are large and repetitive; small responses are left uncompressed
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # Socket.IO event handlers
 @sio.event
 async def connect(sid, environ):
-    print(f"Client connected: {sid}")
+    logger.debug("Client connected: %s", sid)
 
 @sio.event
 async def disconnect(sid):
-    print(f"Client disconnected: {sid}")
+    logger.debug("Client disconnected: %s", sid)
 
 @sio.event
 async def join_workflow(sid, data):
@@ -111,7 +177,7 @@ async def get_homepage():
 async def create_workflow(request: CreateWorkflowRequest):
     """Create a new workflow based on user input"""
     try:
-        print("[API] create_workflow called", {"user_input": request.user_input, "workflow_type": request.workflow_type})
+        logger.debug("create_workflow called: user_input=%r workflow_type=%r", request.user_input, request.workflow_type)
         # Generate workflow ID
         workflow_id = str(uuid.uuid4())
         
@@ -135,11 +201,9 @@ async def create_workflow(request: CreateWorkflowRequest):
         # Execute the workflow
         if "linkedin_workflow" in selected_agents:
             workflow_result = await agent_runner.execute_linkedin_workflow(workflow_id, request.user_input)
-            try:
-                print("[Agent] execute_linkedin_workflow result keys:", list(workflow_result.keys()))
-                print("[Agent] required_input:", workflow_result.get("required_input"))
-            except Exception:
-                pass
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("execute_linkedin_workflow result keys: %s, required_input: %s",
+                             list(workflow_result), workflow_result.get("required_input"))
             
             # Update workflow with results
             if "content_ideas" in workflow_result:
@@ -151,17 +215,14 @@ async def create_workflow(request: CreateWorkflowRequest):
             
             # Add messages to workflow and emit in real-time
             if "messages" in workflow_result:
-                for msg in workflow_result["messages"]:
-                    if msg["sender"] != "system":
-                        workflow_manager.add_message(
-                            workflow_id, 
-                            msg["content"], 
-                            msg["sender"]
-                        )
+                workflow_manager.add_messages(workflow_id, [
+                    (msg["content"], msg["sender"])
+                    for msg in workflow_result["messages"] if msg["sender"] != "system"
+                ])
                 # Emit messages
-                _emit_workflow_messages(workflow_result["messages"], workflow_id)
+                await _emit_workflow_messages(workflow_result["messages"], workflow_id)
             
-            _emit_workflow_update(workflow_id, workflow_result.get("status"), workflow_result.get("current_step"), workflow_result.get("required_input"))
+            await _emit_workflow_update(workflow_id, workflow_result.get("status"), workflow_result.get("current_step"), workflow_result.get("required_input"))
         
         return WorkflowResponse(
             workflow_id=workflow_id,
@@ -170,57 +231,58 @@ async def create_workflow(request: CreateWorkflowRequest):
         )
         
     except Exception as e:
-        print(f"Error creating workflow: {e}")
+        logger.error("Error creating workflow: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/workflows/{workflowId}/chat")
 async def send_workflow_message(workflowId: str, message: WorkflowMessageRequest):
     """Send a message to an active workflow"""
     try:
-        print("[API] chat called", {"workflow_id": workflowId, "message": message.message})
-        # Add user message to workflow manager
-        workflow_manager.add_message(workflowId, "user", message.message)
+        logger.debug("chat called: workflow_id=%s message=%r", workflowId, message.message)
+        # One writer per workflow: concurrent chats would interleave messages and status updates
+        async with workflow_manager.lock(workflowId):
+            # Add user message to workflow manager
+            workflow_manager.add_message(workflowId, message.message, "user")
         
-        # Check if this is a LinkedIn workflow and process it
-        workflow = workflow_manager.get_workflow(workflowId)
-        if workflow and "linkedin_workflow" in workflow.get("agents", []):
-            # Process the message through the agent runner
-            result = await agent_runner.process_workflow_message(workflowId, message.message)
-            try:
-                print("[Agent] process_workflow_message result keys:", list(result.keys()))
-                print("[Agent] required_input:", result.get("required_input"))
-            except Exception:
-                pass
+            # Check if this is a LinkedIn workflow and process it
+            if workflow_manager.has_agent(workflowId, AgentFlag.LINKEDIN_WORKFLOW):
+                # Relay drafts to clients while they stream in, then process the message
+                workflow_state = await agent_runner.get_workflow_status(workflowId)
+                relay = asyncio.create_task(_relay_draft_stream(workflowId, workflow_state)) if workflow_state else None
+                try:
+                    result = await agent_runner.process_workflow_message(workflowId, message.message)
+                finally:
+                    if relay:
+                        relay.cancel()
+                if logger.isEnabledFor(logging.DEBUG) and isinstance(result, dict):
+                    logger.debug("process_workflow_message result keys: %s, required_input: %s",
+                                 list(result), result.get("required_input"))
             
-            if "error" not in result:
-                # Update workflow manager with new messages and status
-                workflow_manager.update_workflow(workflowId, {
-                    "status": result.get("status", "processing"),
-                    "current_step": result.get("current_step", "unknown"),
-                    "messages": result.get("messages", [])
-                })
+                if "error" not in result:
+                    # Update workflow status; the messages live in the agent runner state
+                    workflow_manager.update_workflow_status(workflowId, result.get("status", "processing"))
                 
-                # Emit messages and updates to clients in real-time
-                if result.get("messages"):
-                    _emit_workflow_messages(result["messages"], workflowId)
-                _emit_workflow_update(workflowId, result.get("status"), result.get("current_step"), result.get("required_input"))
+                    # Emit messages and updates to clients in real-time
+                    if result.get("messages"):
+                        await _emit_workflow_messages(result["messages"], workflowId)
+                    await _emit_workflow_update(workflowId, result.get("status"), result.get("current_step"), result.get("required_input"))
                 
-                return {
-                    "success": True,
-                    "workflow_id": workflowId,
-                    "status": result.get("status"),
-                    "current_step": result.get("current_step"),
-                    "messages": result.get("messages", []),
-                    "required_input": result.get("required_input")
-                }
+                    return {
+                        "success": True,
+                        "workflow_id": workflowId,
+                        "status": result.get("status"),
+                        "current_step": result.get("current_step"),
+                        "messages": result.get("messages", []),
+                        "required_input": result.get("required_input")
+                    }
+                else:
+                    return {"error": result["error"]}
             else:
-                return {"error": result["error"]}
-        else:
-            # For non-LinkedIn workflows, just add the message
-            return {"success": True, "message": "Message added to workflow"}
+                # For non-LinkedIn workflows, just add the message
+                return {"success": True, "message": "Message added to workflow"}
             
     except Exception as e:
-        print(f"Error processing workflow message: {e}")
+        logger.error("Error processing workflow message: %s", e)
         return {"error": str(e)}
 
 @app.get("/api/workflows/{workflow_id}", response_model=WorkflowMessageResponse)
@@ -233,17 +295,18 @@ async def get_workflow_status(workflow_id: str):
             raise HTTPException(status_code=404, detail="Workflow not found")
         
         # Get workflow state from agent runner if it's a LinkedIn workflow
-        if "linkedin_workflow" in workflow.agents:
+        if workflow_manager.has_agent(workflow_id, AgentFlag.LINKEDIN_WORKFLOW):
             workflow_state = await agent_runner.get_workflow_status(workflow_id)
             if workflow_state:
-                return WorkflowMessageResponse(
-                    workflow_id=workflow_id,
-                    status=workflow_state.status,
-                    current_step=workflow_state.current_step,
-                    messages=workflow_state.messages,
-                    content_ideas=workflow_state.content_ideas,
-                    post_draft=workflow_state.post_draft,
-                    error=workflow_state.error
+                return Response(
+                    content=workflow_state.to_response_bytes(
+                        content_ideas=workflow_state.content_ideas,
+                        post_draft=workflow_state.post_draft,
+                        error=workflow_state.error,
+                        # Every WorkflowMessageResponse field, like the fallback below
+                        required_input=None
+                    ),
+                    media_type="application/json"
                 )
         
         # Fallback to workflow manager data
@@ -256,7 +319,7 @@ async def get_workflow_status(workflow_id: str):
         )
         
     except Exception as e:
-        print(f"Error getting workflow status: {e}")
+        logger.error("Error getting workflow status: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/workflows")
@@ -266,7 +329,7 @@ async def get_all_workflows():
         workflows = workflow_manager.get_all_workflows()
         return {"workflows": workflows}
     except Exception as e:
-        print(f"Error getting workflows: {e}")
+        logger.error("Error getting workflows: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Background tasks
@@ -279,86 +342,118 @@ async def process_workflow(workflow_id: str, user_input: str):
         # Analyze user input and determine agents to run
         agents_to_run = await agent_runner.analyze_input(user_input)
         
-        # Run agents sequentially
-        for agent_name in agents_to_run:
-            workflow_manager.update_workflow_status(workflow_id, f"Running {agent_name}")
-            
-            # Run agent
-            result = await agent_runner.run_agent(agent_name, user_input, workflow_id)
-            
+        # Run agents concurrently; they have no data dependencies on each other
+        workflow_manager.update_workflow_status(workflow_id, f"Running {', '.join(agents_to_run)}")
+        results = await agent_runner.run_agents(agents_to_run, user_input, workflow_id)
+        
+        for agent_name, result in zip(agents_to_run, results):
             # Add result to workflow
             workflow_manager.add_agent_result(workflow_id, agent_name, result)
             
-                    # Broadcast update via Socket.IO
-        await sio.emit('workflow_update', {
-            'workflow_id': workflow_id,
-            'agent': agent_name,
-            'result': result,
-            'status': 'completed'
-        }, room=workflow_id)
+            # Broadcast update via Socket.IO
+            if not _has_listeners(workflow_id):
+                continue
+            await sio.emit('workflow_update', {
+                'workflow_id': workflow_id,
+                'agent': agent_name,
+                'result': result,
+                'status': 'completed'
+            }, room=workflow_id)
         
         # Mark workflow as completed
         workflow_manager.update_workflow_status(workflow_id, "completed")
         
         # Broadcast completion via Socket.IO
-        await sio.emit('workflow_completed', {
-            'workflow_id': workflow_id,
-            'message': 'Workflow completed successfully'
-        }, room=workflow_id)
+        if _has_listeners(workflow_id):
+            await sio.emit('workflow_completed', {
+                'workflow_id': workflow_id,
+                'message': 'Workflow completed successfully'
+            }, room=workflow_id)
         
     except Exception as e:
-        workflow_manager.update_workflow_status(workflow_id, f"error: {str(e)}")
-        await sio.emit('workflow_error', {
-            'workflow_id': workflow_id,
-            'error': str(e)
-        }, room=workflow_id)
+        workflow_manager.update_workflow_status(workflow_id, f"{STATUS_ERROR_PREFIX}: {e}")
+        if _has_listeners(workflow_id):
+            await sio.emit('workflow_error', {
+                'workflow_id': workflow_id,
+                'error': str(e)
+            }, room=workflow_id)
 
 async def process_chat_message(workflow_id: str, message: str):
     """Process a chat message with agents if needed"""
     try:
         # Check if message requires agent processing
         if await agent_runner.needs_agent_processing(message):
-            # Run appropriate agent
-            agent_name = await agent_runner.determine_agent(message)
-            result = await agent_runner.run_agent(agent_name, message, workflow_id)
-            
-            # Add result to workflow
-            workflow_manager.add_agent_result(workflow_id, agent_name, result)
-            
-                    # Broadcast update via Socket.IO
-        await sio.emit('chat_response', {
-            'workflow_id': workflow_id,
-            'agent': agent_name,
-            'response': result
-        }, room=workflow_id)
+            async with workflow_manager.lock(workflow_id):
+                # Run appropriate agent
+                agent_name = await agent_runner.determine_agent(message)
+                result = await agent_runner.run_agent(agent_name, message, workflow_id)
+                
+                # Add result to workflow
+                workflow_manager.add_agent_result(workflow_id, agent_name, result)
+                
+                # Broadcast update via Socket.IO
+                if _has_listeners(workflow_id):
+                    await sio.emit('chat_response', {
+                        'workflow_id': workflow_id,
+                        'agent': agent_name,
+                        'response': result
+                    }, room=workflow_id)
     
     except Exception as e:
-        print(f"Error processing chat message: {e}")
-
-def _emit_workflow_messages(messages: List[Dict], workflow_id: str):
-    # Emit each non-user message to the specific workflow room
-    async def _emit_all():
-        for msg in messages:
-            if msg.get("sender") != "user":
-                await sio.emit('workflow_message', {
-                    'workflow_id': workflow_id,
-                    'message': msg
-                }, room=workflow_id)
-    asyncio.create_task(_emit_all())
-
-
-def _emit_workflow_update(workflow_id: str, status: Optional[str] = None, current_step: Optional[str] = None, required_input: Optional[Dict] = None):
-    async def _emit():
-        await sio.emit('workflow_update', {
+        logger.error("Error processing chat message: %s", e)
+
+def _has_listeners(room: str) -> bool:
+    """False only when no local client has joined room; with the Redis manager other workers may have"""
+    if REDIS_URL:
+        return True
+    return bool(sio.manager.rooms.get('/', {}).get(room))
+
+
+async def _emit_workflow_messages(messages: List[Dict], workflow_id: str):
+    # Emit the non-user messages to the workflow room as one batched event
+    if not _has_listeners(workflow_id):
+        return
+    payload = [msg for msg in messages if msg.get("sender") != "user"]
+    if not payload:
+        return
+    await sio.emit('workflow_messages', {
+        'workflow_id': workflow_id,
+        'messages': payload
+    }, room=workflow_id)
+    if LEGACY_MESSAGE_EVENTS:
+        for msg in payload:
+            await sio.emit('workflow_message', {
+                'workflow_id': workflow_id,
+                'message': msg
+            }, room=workflow_id)
+
+
+async def _relay_draft_stream(workflow_id: str, workflow_state):
+    # Emit the partial post draft each time the agent runner extends it
+    while True:
+        await workflow_state.draft_event.wait()
+        workflow_state.draft_event.clear()
+        if not _has_listeners(workflow_id):
+            continue
+        await sio.emit('draft_stream', {
             'workflow_id': workflow_id,
-            'status': status,
-            'current_step': current_step,
-            'required_input': required_input,
+            'post_draft': workflow_state.post_draft,
         }, room=workflow_id)
-    asyncio.create_task(_emit())
+
+
+async def _emit_workflow_update(workflow_id: str, status: Optional[str] = None, current_step: Optional[str] = None, required_input: Optional[Dict] = None):
+    if not _has_listeners(workflow_id):
+        return
+    await sio.emit('workflow_update', {
+        'workflow_id': workflow_id,
+        'status': status,
+        'current_step': current_step,
+        'required_input': required_input,
+    }, room=workflow_id)
 
 # Build combined ASGI app for Socket.IO + FastAPI
 combined_app = socketio.ASGIApp(sio, app)
 
 if __name__ == "__main__":
-    uvicorn.run(combined_app, host="0.0.0.0", port=8000)
+    # uvloop and httptools ship with uvicorn[standard]; fall back to asyncio where uvloop is unavailable
+    uvicorn.run(combined_app, host="0.0.0.0", port=8000, loop="uvloop" if uvloop else "asyncio", http="httptools")
@@ -2,6 +2,9 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Optional, Union, Dict, Any
 
+# Failed workflows carry f"{STATUS_ERROR_PREFIX}: {e}" as their status
+STATUS_ERROR_PREFIX = "error"
+
 class AgentResult(BaseModel):
     """Result from an agent execution"""
     agent_name: str
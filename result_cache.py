@@ -0,0 +1,84 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Optional
+
+try:
+    from redis import asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:
+    aioredis = None
+    RedisError = OSError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def task_hash(text: str) -> str:
+    """Stable key for a user prompt; surrounding whitespace does not change it"""
+    return hashlib.sha256(text.strip().encode()).hexdigest()
+
+class ResultCache:
+    """Redis-backed cache of agent results shared across workers; a no-op when Redis is unavailable"""
+
+    def __init__(self, url: Optional[str] = None, ttl: int = 3600, prefix: str = "creato:agent"):
+        self.url = url or os.getenv("REDIS_URL")
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._redis = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis is not None
+
+    async def connect(self) -> None:
+        """Open the connection pool; the cache stays disabled if Redis is missing or unreachable"""
+        if aioredis is None or not self.url:
+            return
+        client = aioredis.from_url(self.url, max_connections=32)
+        try:
+            await client.ping()
+        except (RedisError, OSError) as e:
+            logger.warning("Result cache disabled, Redis unreachable: %s", e)
+            await client.aclose()
+            return
+        self._redis = client
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _key(self, agent_type: str, text: str) -> str:
+        return f"{self.prefix}:{agent_type}:{task_hash(text)}"
+
+    async def get(self, agent_type: str, text: str) -> Optional[Any]:
+        """Return the cached result for text, or None on a miss"""
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self._key(agent_type, text))
+        except (RedisError, OSError) as e:
+            logger.warning("Result cache read failed: %s", e)
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return orjson.loads(raw) if orjson else json.loads(raw)
+
+    async def set(self, agent_type: str, text: str, value: Any) -> None:
+        """Store value for text with the cache TTL"""
+        if self._redis is None:
+            return
+        payload = orjson.dumps(value) if orjson else json.dumps(value)
+        try:
+            await self._redis.setex(self._key(agent_type, text), self.ttl, payload)
+        except (RedisError, OSError) as e:
+            logger.warning("Result cache write failed: %s", e)
@@ -1,142 +1,396 @@
 import asyncio
-from datetime import datetime
-from typing import Dict, List, Optional, Callable, Tuple, Any
-from models import WorkflowThread, AgentResult, AgentMessage
+import atexit
+import bisect
+import io
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import IntFlag, auto
+from datetime import datetime, timedelta, timezone
+from typing import IO, Deque, Dict, List, Optional, Callable, Tuple, Any
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from models import STATUS_ERROR_PREFIX, WorkflowThread, AgentResult, AgentMessage
 import os
 from pathlib import Path
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def _dumps(obj: Any, indent: bool = False) -> bytes:
+    """Encode obj as JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        option = orjson.OPT_NAIVE_UTC | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=str, option=option)
+    return json.dumps(obj, indent=2 if indent else None, default=str).encode("utf-8")
+
+def _loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def _as_text(value: Any) -> str:
+    """value as a string field; agents may return dicts, lists or models, which become JSON"""
+    if isinstance(value, str):
+        return value
+    return to_json(value, fallback=str).decode()
+
+# Compiled once; validating a whole list is one call into pydantic-core
+_MESSAGES_ADAPTER = TypeAdapter(List[AgentMessage])
+_RESULTS_ADAPTER = TypeAdapter(List[AgentResult])
+
+# Per-workflow history kept in memory (and checkpointed); older entries are dropped first
+MAX_WORKFLOW_MESSAGES = int(os.getenv("MAX_WORKFLOW_MESSAGES", "1000"))
+
+def _history(items=()) -> deque:
+    return deque(items, maxlen=MAX_WORKFLOW_MESSAGES)
+
+def _epoch(value: datetime) -> float:
+    # Naive timestamps (datetime.utcnow() callers) are taken as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class AgentFlag(IntFlag):
+    """One bit per agent id, so "does this workflow run X" is a single AND"""
+    LINKEDIN_WORKFLOW = auto()
+    LINKEDIN_IDEATION = auto()
+    LINKEDIN_DRAFTING = auto()
+    LINKEDIN_PUBLISHING = auto()
+    YOUTUBE_SCRIPT = auto()
+    YOUTUBE_PUBLISHING = auto()
+    CONTENT_ANALYSIS = auto()
+    SPONSORSHIP_AGENT = auto()
+
+def _agent_flags(agents: List[str]) -> AgentFlag:
+    flags = AgentFlag(0)
+    for agent in agents:
+        flag = AgentFlag.__members__.get(agent.upper())
+        if flag is not None:
+            flags |= flag
+    return flags
+
+@dataclass(slots=True)
+class WorkflowState:
+    """Everything the manager tracks for one workflow, so each operation is a single lookup"""
+    thread: WorkflowThread
+    status: str
+    results: Deque[AgentResult] = field(default_factory=_history)
+    messages: Deque[AgentMessage] = field(default_factory=_history)
+    # Scaffolding step state used by execute_workflow_step; checkpointed as "state" records
+    step: Dict[str, Any] = field(default_factory=lambda: {"current_step": "start"})
+    flags: AgentFlag = field(init=False)
+    created: float = field(init=False)
+    # get_workflow_summary's last result; cleared by every mutation of this workflow
+    summary: Optional[Dict[str, Any]] = field(default=None, init=False)
+
+    def __post_init__(self):
+        self.flags = _agent_flags(self.thread.agents)
+        self.created = _epoch(self.thread.created_at)
+
+def _apply_event(data: Optional[Dict[str, Any]], event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fold one checkpoint log record into a checkpoint bundle"""
+    kind, payload, seq = event["t"], event["data"], event.get("n")
+    if data is not None and seq is not None and seq <= data.get("seq", 0):
+        # Already folded into the snapshot; the log outlived a compaction that crashed
+        # between replacing the snapshot and removing the log
+        return data
+    if kind == "workflow":
+        return {"workflow": payload, "status": payload.get("status"), "messages": [], "agent_results": [], "seq": seq or 0}
+    if data is None:
+        # The workflow's creation record never made it to disk
+        return None
+    if seq is not None:
+        data["seq"] = seq
+    if kind == "status":
+        data["status"] = data["workflow"]["status"] = payload
+    elif kind == "msg":
+        data["messages"].append(payload)
+    elif kind == "result":
+        data["agent_results"].append(payload)
+    elif kind == "state":
+        data["state"] = payload
+    return data
+
+def _fsync_dir(directory: Path) -> None:
+    """fsync directory so a rename into it survives a crash"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _validate_selection(user_input: str) -> Tuple[bool, str]:
+    if user_input.isdigit():
+        if 1 <= int(user_input) <= 5:
+            return True, ""
+        return False, "Please select a number between 1 and 5"
+    if user_input.lower() == "refine":
+        return True, ""
+    return False, "Please select an idea (1-5) or type 'refine'"
+
+# Input checks per workflow step; steps without an entry accept any input
+_STEP_VALIDATORS: Dict[str, Callable[[str], Tuple[bool, str]]] = {
+    "waiting_for_selection": _validate_selection,
+}
+
+# Constant output of the mock ideation step, built once; callers get copies
+_MOCK_IDEAS = tuple({"title": f"Idea {i+1}", "summary": ""} for i in range(5))
+_MOCK_IDEA_OPTIONS = tuple({"index": i+1, "title": idea["title"]} for i, idea in enumerate(_MOCK_IDEAS))
+_MOCK_IDEAS_RESULT = "Generated ideas:\n" + "\n".join(f"{i+1}. {idea['title']}" for i, idea in enumerate(_MOCK_IDEAS))
+
+# Status prefixes persisted immediately instead of waiting for the next batched flush
+_TERMINAL_STATUSES = ("completed", STATUS_ERROR_PREFIX)
+# Subscriber notifications waiting on the event loop before new ones are dropped
+_MAX_QUEUED_NOTIFICATIONS = 10_000
+# Checkpoint queues and writes are striped by workflow id (power of two, masked)
+_LOCK_STRIPES = 64
+
 class WorkflowManager:
-    def __init__(self):
-        self.workflows: Dict[str, WorkflowThread] = {}
-        self.workflow_status: Dict[str, str] = {}
-        self.agent_results: Dict[str, List[AgentResult]] = {}
-        self.workflow_messages: Dict[str, List[AgentMessage]] = {}
+    def __init__(self, flush_interval: float = 1.0, compact_events: int = 500):
+        self.state: Dict[str, WorkflowState] = {}
         # Simple checkpointing directory (can be swapped with LangGraph checkpointer)
         self.checkpoint_dir = Path(".wf_checkpoints")
         self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
         # Subscribers for realtime notifications per workflow
         self._subscribers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._queued_notifications = 0
+        # Per-workflow locks that serialize a chat turn's reads and writes
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Mutations queue one JSON-lines record each; a background thread appends them to
+        # <id>.jsonl once per flush_interval and folds a log of compact_events records
+        # into the <id>.json snapshot
+        self.flush_interval = flush_interval
+        self.compact_events = compact_events
+        # One queue + lock pair per stripe: a write-through flush of one workflow only waits on
+        # its own stripe, and a given workflow always maps to the same writer lock so its
+        # records stay in order
+        self._pending: List[Dict[str, List[bytes]]] = [{} for _ in range(_LOCK_STRIPES)]
+        self._pending_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._write_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._log_events: Dict[str, int] = {}
+        # Last record sequence number per workflow; snapshots store the one they folded up to.
+        # Kept across delete_workflow so a re-added id never reuses numbers its old files hold
+        self._seq: Dict[str, int] = {}
+        self._path_cache: Dict[str, Tuple[Path, Path]] = {}
+        # (created epoch, id) in order, so cleanup takes a prefix instead of scanning everything
+        self._by_created: List[Tuple[float, str]] = []
+        # Bumped on every mutation; get_workflow_stats reuses its result while it is unchanged
+        self._stats_version = 0
+        self._stats_cache: Optional[Tuple[int, Dict[str, Any]]] = None
+        # Write-through work (terminal-status flushes, deleted workflows' files) runs here
+        # rather than on the caller's event loop; the stripe writer locks keep it ordered with
+        # the batched flusher
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wf-ckpt")
+        self._stop_flusher = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="workflow-checkpoint", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
         
     def add_workflow(self, workflow: WorkflowThread):
         """Add a new workflow to the manager"""
-        self.workflows[workflow.id] = workflow
-        self.workflow_status[workflow.id] = workflow.status
-        self.agent_results[workflow.id] = []
-        self.workflow_messages[workflow.id] = []
+        self._install(workflow.id, WorkflowState(thread=workflow, status=workflow.status))
         
-        print(f"Added workflow {workflow.id}: {workflow.user_input}")
-        self._save_checkpoint(workflow.id)
+        logger.debug("Added workflow %s: %s", workflow.id, workflow.user_input)
+        self._append_event(workflow.id, "workflow", workflow.model_dump_json())
         self._notify_subscribers(workflow.id, {"type": "workflow_added", "workflow_id": workflow.id})
         
+    def _install(self, workflow_id: str, ws: WorkflowState) -> None:
+        old = self.state.get(workflow_id)
+        if old is not None:
+            self._discard_created(old.created, workflow_id)
+        self.state[workflow_id] = ws
+        bisect.insort(self._by_created, (ws.created, workflow_id))
+
+    def _discard_created(self, created: float, workflow_id: str) -> None:
+        i = bisect.bisect_left(self._by_created, (created, workflow_id))
+        if i < len(self._by_created) and self._by_created[i] == (created, workflow_id):
+            del self._by_created[i]
+
     def get_workflow(self, workflow_id: str) -> Optional[WorkflowThread]:
         """Get a specific workflow by ID"""
-        return self.workflows.get(workflow_id)
+        ws = self.state.get(workflow_id)
+        return ws.thread if ws else None
+        
+    def lock(self, workflow_id: str) -> asyncio.Lock:
+        """Lock to hold (async with) across one workflow's mutate-and-emit sequence"""
+        lock = self._locks.get(workflow_id)
+        if lock is None:
+            lock = self._locks[workflow_id] = asyncio.Lock()
+        return lock
+        
+    def has_agent(self, workflow_id: str, flag: AgentFlag) -> bool:
+        """Whether the workflow was created with the given agent"""
+        ws = self.state.get(workflow_id)
+        return bool(ws and ws.flags & flag)
         
     def get_all_workflows(self) -> List[WorkflowThread]:
         """Get all workflows"""
-        return list(self.workflows.values())
+        return [ws.thread for ws in self.state.values()]
         
-    def update_workflow_status(self, workflow_id: str, status: str):
-        """Update the status of a workflow"""
-        if workflow_id in self.workflows:
-            self.workflows[workflow_id].status = status
-            self.workflow_status[workflow_id] = status
-            print(f"Workflow {workflow_id} status updated to: {status}")
-            self._save_checkpoint(workflow_id)
+    def update_workflow_status(self, workflow_id: str, status: str, sync: Optional[bool] = None):
+        """Update the status of a workflow; terminal statuses (or sync=True) are flushed right
+        away on the checkpoint I/O thread instead of waiting for the next batch"""
+        ws = self.state.get(workflow_id)
+        if ws:
+            ws.thread.status = status
+            ws.status = status
+            logger.debug("Workflow %s status updated to: %s", workflow_id, status)
+            self._append_event(workflow_id, "status", _dumps(status).decode())
+            if sync is None:
+                sync = status.startswith(_TERMINAL_STATUSES)
+            if sync:
+                self._submit_io(self.flush, workflow_id)
             self._notify_subscribers(workflow_id, {"type": "status", "workflow_id": workflow_id, "status": status})
             
     def add_agent_result(self, workflow_id: str, agent_name: str, result: str):
-        """Add an agent result to a workflow"""
-        if workflow_id in self.agent_results:
-            agent_result = AgentResult(
+        """Add an agent result to a workflow; a non-string result is stored as its JSON text"""
+        ws = self.state.get(workflow_id)
+        if ws:
+            # run_agent returns whatever the agent produced (a dict for linkedin_workflow, the
+            # ideas for linkedin_ideation), so coerce it here; model_construct skips the check
+            # and an unchecked value would fail validation when the checkpoint is reloaded
+            result = _as_text(result)
+            now = datetime.utcnow()
+            agent_result = AgentResult.model_construct(
                 agent_name=agent_name,
                 result=result,
-                timestamp=datetime.utcnow()
+                timestamp=now
             )
-            self.agent_results[workflow_id].append(agent_result)
+            ws.results.append(agent_result)
             
-            # Also add to workflow messages
-            message = AgentMessage(
-                sender=agent_name,
-                content=result,
-                timestamp=datetime.utcnow(),
-                message_type="agent_result"
-            )
-            self.add_message(workflow_id, result, agent_name)
+            # Also add to workflow messages, stamped with the same clock read
+            self.add_message(workflow_id, result, agent_name, timestamp=now)
             
-            print(f"Added result from {agent_name} to workflow {workflow_id}")
-            self._save_checkpoint(workflow_id)
+            logger.debug("Added result from %s to workflow %s", agent_name, workflow_id)
+            self._append_event(workflow_id, "result", agent_result.model_dump_json())
             self._notify_subscribers(workflow_id, {"type": "agent_result", "workflow_id": workflow_id, "agent": agent_name, "result": result})
             
-    def add_message(self, workflow_id: str, content: str, sender: str):
-        """Add a message to a workflow"""
-        if workflow_id in self.workflow_messages:
-            message = AgentMessage(
+    def add_message(self, workflow_id: str, content: str, sender: str, timestamp: Optional[datetime] = None):
+        """Add a message to a workflow; non-string content is stored as its JSON text"""
+        ws = self.state.get(workflow_id)
+        if ws:
+            message = AgentMessage.model_construct(
                 sender=sender,
-                content=content,
-                timestamp=datetime.utcnow(),
+                content=_as_text(content),
+                timestamp=timestamp or datetime.utcnow(),
                 message_type="chat" if sender == "user" else "agent_result"
             )
-            self.workflow_messages[workflow_id].append(message)
-            self._save_checkpoint(workflow_id)
-            self._notify_subscribers(workflow_id, {"type": "message", "workflow_id": workflow_id, "message": message.dict()})
+            ws.messages.append(message)
+            self._append_event(workflow_id, "msg", message.model_dump_json())
+            # The log record is the one serialization every message pays; the dict form is
+            # only built when someone is listening
+            if workflow_id in self._subscribers:
+                self._notify_subscribers(workflow_id, {"type": "message", "workflow_id": workflow_id, "message": message.model_dump()})
+            
+    def add_messages(self, workflow_id: str, messages: List[Tuple[str, str]]):
+        """Add (content, sender) pairs to a workflow with a single checkpoint write"""
+        ws = self.state.get(workflow_id)
+        if not ws or not messages:
+            return
+        now = datetime.utcnow()
+        added = [
+            AgentMessage.model_construct(
+                sender=sender,
+                content=_as_text(content),
+                timestamp=now,
+                message_type="chat" if sender == "user" else "agent_result"
+            )
+            for content, sender in messages
+        ]
+        ws.messages.extend(added)
+        for message in added:
+            self._append_event(workflow_id, "msg", message.model_dump_json())
+        if workflow_id in self._subscribers:
+            for message in added:
+                self._notify_subscribers(workflow_id, {"type": "message", "workflow_id": workflow_id, "message": message.model_dump()})
             
     def get_workflow_messages(self, workflow_id: str) -> List[AgentMessage]:
         """Get all messages for a workflow"""
-        return self.workflow_messages.get(workflow_id, [])
+        ws = self.state.get(workflow_id)
+        return list(ws.messages) if ws else []
         
     def get_workflow_agent_results(self, workflow_id: str) -> List[AgentResult]:
         """Get all agent results for a workflow"""
-        return self.agent_results.get(workflow_id, [])
+        ws = self.state.get(workflow_id)
+        return list(ws.results) if ws else []
         
     def get_workflow_summary(self, workflow_id: str) -> Dict:
         """Get a summary of a workflow including status, agents, and recent messages"""
-        if workflow_id not in self.workflows:
+        ws = self.state.get(workflow_id)
+        if not ws:
             return None
             
-        workflow = self.workflows[workflow_id]
-        messages = self.get_workflow_messages(workflow_id)
-        agent_results = self.get_workflow_agent_results(workflow_id)
-        
-        return {
-            "id": workflow.id,
-            "user_input": workflow.user_input,
-            "status": workflow.status,
-            "created_at": workflow.created_at.isoformat(),
-            "agent_count": len(agent_results),
-            "message_count": len(messages),
-            "recent_messages": messages[-5:] if messages else [],  # Last 5 messages
-            "agents_used": [result.agent_name for result in agent_results]
-        }
+        if ws.summary is None:
+            workflow = ws.thread
+            messages = ws.messages
+            agent_results = ws.results
+            
+            ws.summary = {
+                "id": workflow.id,
+                "user_input": workflow.user_input,
+                "status": workflow.status,
+                "created_at": workflow.created_at.isoformat(),
+                "agent_count": len(agent_results),
+                "message_count": len(messages),
+                "recent_messages": [messages[i] for i in range(max(len(messages) - 5, 0), len(messages))],  # Last 5 messages
+                "agents_used": [result.agent_name for result in agent_results]
+            }
+        # Fresh lists per call so callers never mutate the cached summary
+        summary = dict(ws.summary)
+        summary["recent_messages"] = list(summary["recent_messages"])
+        summary["agents_used"] = list(summary["agents_used"])
+        return summary
         
     def delete_workflow(self, workflow_id: str):
         """Delete a workflow and all its associated data"""
-        if workflow_id in self.workflows:
-            del self.workflows[workflow_id]
-            
-        if workflow_id in self.workflow_status:
-            del self.workflow_status[workflow_id]
+        ws = self.state.pop(workflow_id, None)
+        if ws is not None:
+            self._discard_created(ws.created, workflow_id)
+        self._locks.pop(workflow_id, None)
+        # Drop its queued records now and its files on the I/O thread, so neither a pending
+        # flush nor load_all_checkpoints brings the workflow back
+        stripe = self._stripe(workflow_id)
+        with self._pending_locks[stripe]:
+            self._pending[stripe].pop(workflow_id, None)
+        self._submit_io(self._remove_checkpoint, workflow_id, self._paths(workflow_id))
+        self._path_cache.pop(workflow_id, None)
+        self._stats_version += 1
             
-        if workflow_id in self.agent_results:
-            del self.agent_results[workflow_id]
-            
-        if workflow_id in self.workflow_messages:
-            del self.workflow_messages[workflow_id]
-            
-        print(f"Deleted workflow {workflow_id}")
+        logger.debug("Deleted workflow %s", workflow_id)
         
     def get_workflow_stats(self) -> Dict:
         """Get overall statistics about all workflows"""
-        total_workflows = len(self.workflows)
-        completed_workflows = sum(1 for status in self.workflow_status.values() if status == "completed")
-        processing_workflows = sum(1 for status in self.workflow_status.values() if status == "processing")
-        error_workflows = sum(1 for status in self.workflow_status.values() if "error" in status)
-        
-        total_agents_run = sum(len(results) for results in self.agent_results.values())
-        total_messages = sum(len(messages) for messages in self.workflow_messages.values())
+        cached = self._stats_cache
+        if cached is not None and cached[0] == self._stats_version:
+            return dict(cached[1])
+        version = self._stats_version
+        total_workflows = len(self.state)
+        completed_workflows = processing_workflows = error_workflows = 0
+        total_agents_run = total_messages = 0
+        # One pass accumulating every counter
+        for ws in self.state.values():
+            status = ws.status
+            if status == "completed":
+                completed_workflows += 1
+            elif status == "processing":
+                processing_workflows += 1
+            elif status.startswith(STATUS_ERROR_PREFIX):
+                error_workflows += 1
+            total_agents_run += len(ws.results)
+            total_messages += len(ws.messages)
         
-        return {
+        stats = {
             "total_workflows": total_workflows,
             "completed_workflows": completed_workflows,
             "processing_workflows": processing_workflows,
@@ -145,150 +399,316 @@ class WorkflowManager:
             "total_messages": total_messages,
             "success_rate": (completed_workflows / total_workflows * 100) if total_workflows > 0 else 0
         }
+        self._stats_cache = (version, stats)
+        return dict(stats)
         
     def cleanup_old_workflows(self, days_old: int = 30):
         """Clean up workflows older than specified days"""
-        cutoff_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        cutoff_date = cutoff_date.replace(day=cutoff_date.day - days_old)
+        cutoff_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_old)
         
-        workflows_to_delete = []
-        for workflow_id, workflow in self.workflows.items():
-            if workflow.created_at < cutoff_date:
-                workflows_to_delete.append(workflow_id)
+        stop = bisect.bisect_left(self._by_created, (_epoch(cutoff_date),))
+        workflows_to_delete = [wid for _, wid in self._by_created[:stop]]
+        del self._by_created[:stop]
                 
         for workflow_id in workflows_to_delete:
             self.delete_workflow(workflow_id)
             
-        print(f"Cleaned up {len(workflows_to_delete)} old workflows")
+        logger.info("Cleaned up %d old workflows", len(workflows_to_delete))
         
     def export_workflow_data(self, workflow_id: str) -> str:
         """Export workflow data as JSON string"""
-        if workflow_id not in self.workflows:
+        buf = io.BytesIO()
+        if not self.write_workflow_export(workflow_id, buf):
             return None
+        return buf.getvalue().decode()
+
+    def write_workflow_export(self, workflow_id: str, fp: IO[bytes]) -> bool:
+        """Stream the export JSON to fp one record at a time; False if the workflow is unknown"""
+        ws = self.state.get(workflow_id)
+        if not ws:
+            return False
             
-        workflow = self.workflows[workflow_id]
-        messages = self.get_workflow_messages(workflow_id)
-        agent_results = self.get_workflow_agent_results(workflow_id)
-        
-        export_data = {
-            "workflow": {
-                "id": workflow.id,
-                "user_input": workflow.user_input,
-                "status": workflow.status,
-                "created_at": workflow.created_at.isoformat()
-            },
-            "messages": [msg.dict() for msg in messages],
-            "agent_results": [result.dict() for result in agent_results]
-        }
-        
-        return json.dumps(export_data, indent=2, default=str)
+        workflow = ws.thread
+        fp.write(b'{"workflow":')
+        fp.write(_dumps({
+            "id": workflow.id,
+            "user_input": workflow.user_input,
+            "status": workflow.status,
+            "created_at": workflow.created_at.isoformat()
+        }))
+        for key, items in ((b"messages", list(ws.messages)), (b"agent_results", list(ws.results))):
+            fp.write(b',"' + key + b'":[')
+            for n, item in enumerate(items):
+                if n:
+                    fp.write(b",")
+                fp.write(item.model_dump_json().encode())
+            fp.write(b"]")
+        fp.write(b"}")
+        return True
 
     # --- Checkpointing helpers ---
+    def _paths(self, workflow_id: str) -> Tuple[Path, Path]:
+        """(snapshot, log) paths for a workflow, built once per id"""
+        paths = self._path_cache.get(workflow_id)
+        if paths is None:
+            paths = self._path_cache[workflow_id] = (
+                self.checkpoint_dir / f"{workflow_id}.json",
+                self.checkpoint_dir / f"{workflow_id}.jsonl",
+            )
+        return paths
+
     def _checkpoint_path(self, workflow_id: str) -> Path:
-        return self.checkpoint_dir / f"{workflow_id}.json"
+        return self._paths(workflow_id)[0]
 
-    def _save_checkpoint(self, workflow_id: str) -> None:
-        """Persist workflow thread, messages, and results to disk."""
+    def _log_path(self, workflow_id: str) -> Path:
+        return self._paths(workflow_id)[1]
+
+    def _append_event(self, workflow_id: str, kind: str, payload: str) -> None:
+        """Queue one delta record for the workflow's log; payload is already-encoded JSON"""
+        self._stats_version += 1
+        ws = self.state.get(workflow_id)
+        if ws is not None:
+            ws.summary = None
+        seq = self._seq[workflow_id] = self._seq.get(workflow_id, 0) + 1
+        record = f'{{"t":"{kind}","n":{seq},"data":{payload}}}\n'.encode()
+        stripe = self._stripe(workflow_id)
+        with self._pending_locks[stripe]:
+            self._pending[stripe].setdefault(workflow_id, []).append(record)
+
+    def _submit_io(self, fn: Callable, *args: Any) -> None:
         try:
-            data = {
-                "workflow": self.workflows.get(workflow_id).dict() if workflow_id in self.workflows else None,
-                "status": self.workflow_status.get(workflow_id),
-                "messages": [m.dict() for m in self.workflow_messages.get(workflow_id, [])],
-                "agent_results": [r.dict() for r in self.agent_results.get(workflow_id, [])],
-                "saved_at": datetime.utcnow().isoformat(),
-            }
-            with self._checkpoint_path(workflow_id).open("w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+            self._io_pool.submit(fn, *args)
+        except RuntimeError:
+            # Pool already shut down by close(); nothing else will write, so do it here
+            fn(*args)
+
+    def _remove_checkpoint(self, workflow_id: str, paths: Tuple[Path, Path]) -> None:
+        # Under the writer lock, so a flush that already took the workflow's records finishes
+        # appending before the files go
+        with self._write_locks[self._stripe(workflow_id)]:
+            if workflow_id in self.state:
+                # Re-added since the delete; its new records are in these files
+                return
+            self._log_events.pop(workflow_id, None)
+            for path in paths:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError as e:
+                    logger.warning("Could not remove checkpoint %s: %s", path, e)
+
+    def _flush_loop(self) -> None:
+        while not self._stop_flusher.wait(self.flush_interval):
+            self.flush()
+
+    @staticmethod
+    def _stripe(workflow_id: str) -> int:
+        return hash(workflow_id) & (_LOCK_STRIPES - 1)
+
+    def flush(self, workflow_id: Optional[str] = None) -> None:
+        """Append queued records to the checkpoint logs, for one workflow or all of them"""
+        if workflow_id is not None:
+            self._flush_stripe(self._stripe(workflow_id), workflow_id)
+            return
+        for stripe in range(_LOCK_STRIPES):
+            self._flush_stripe(stripe)
+
+    def _flush_stripe(self, stripe: int, workflow_id: Optional[str] = None) -> None:
+        # The writer lock is held across the swap so two flushes of a stripe cannot write a
+        # workflow's records out of order
+        with self._write_locks[stripe]:
+            with self._pending_locks[stripe]:
+                if workflow_id is None:
+                    pending, self._pending[stripe] = self._pending[stripe], {}
+                else:
+                    records = self._pending[stripe].pop(workflow_id, None)
+                    pending = {workflow_id: records} if records else {}
+            for wid, records in pending.items():
+                try:
+                    with self._log_path(wid).open("ab") as f:
+                        f.write(b"".join(records))
+                except OSError as e:
+                    with self._pending_locks[stripe]:
+                        self._pending[stripe].setdefault(wid, [])[:0] = records
+                    logger.warning("Checkpoint log write failed for %s: %s", wid, e)
+                    continue
+                events = self._log_events.get(wid, 0) + len(records)
+                if events >= self.compact_events:
+                    self._compact(wid)
+                    events = 0
+                self._log_events[wid] = events
+
+    def close(self) -> None:
+        """Stop the background writer and flush anything still pending"""
+        self._stop_flusher.set()
+        self._io_pool.shutdown(wait=True)
+        self.flush()
+
+    def _compact(self, workflow_id: str) -> None:
+        """Rewrite snapshot + log as a single snapshot; caller holds the stripe's writer lock.
+        Built from the files rather than memory, so records queued meanwhile stay valid deltas"""
+        try:
+            data = self._read_checkpoint(workflow_id)
+            if data is None:
+                return
+            data["messages"] = data["messages"][-MAX_WORKFLOW_MESSAGES:]
+            data["agent_results"] = data["agent_results"][-MAX_WORKFLOW_MESSAGES:]
+            data["saved_at"] = datetime.utcnow().isoformat()
+            # Write-then-rename: a crash leaves either the old snapshot or the new one, never a
+            # torn file. The log is removed only after the rename is durable; if that step is
+            # lost, replay skips the records the snapshot's seq already covers
+            path = self._checkpoint_path(workflow_id)
+            tmp_path = path.with_suffix(".json.tmp")
+            with tmp_path.open("wb") as f:
+                f.write(_dumps(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            _fsync_dir(self.checkpoint_dir)
+            self._log_path(workflow_id).unlink(missing_ok=True)
         except Exception as e:
-            print(f"[Checkpoint] save failed for {workflow_id}: {e}")
+            logger.warning("Checkpoint compaction failed for %s: %s", workflow_id, e)
 
-    def load_checkpoint(self, workflow_id: str) -> Optional[Dict]:
-        """Load persisted state if available and hydrate in-memory stores."""
+    def _read_checkpoint(self, workflow_id: str) -> Optional[Dict]:
+        """Snapshot (if any) with the log's records replayed on top"""
+        data = None
         path = self._checkpoint_path(workflow_id)
-        if not path.exists():
-            return None
+        if path.exists():
+            with path.open("rb") as f:
+                data = _loads(f.read())
+        log_path = self._log_path(workflow_id)
+        if log_path.exists():
+            with log_path.open("rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        event = _loads(line)
+                    except ValueError:
+                        # Torn final record from a crash mid-append
+                        break
+                    data = _apply_event(data, event)
+        return data
+
+    def _load_single(self, workflow_id: str) -> Tuple[Optional[Dict], Optional[WorkflowState]]:
+        """Read and rehydrate one checkpoint without touching shared state"""
         try:
-            with path.open("r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = self._read_checkpoint(workflow_id)
+            if data is None:
+                return None, None
             wf = data.get("workflow")
-            if wf:
-                self.workflows[workflow_id] = WorkflowThread(**wf)
-                self.workflow_status[workflow_id] = data.get("status", wf.get("status", "processing"))
-            self.workflow_messages[workflow_id] = [AgentMessage(**m) for m in data.get("messages", [])]
-            self.agent_results[workflow_id] = [AgentResult(**r) for r in data.get("agent_results", [])]
-            print(f"[Checkpoint] loaded {workflow_id}")
-            return data
+            if not wf:
+                return data, None
+            return data, WorkflowState(
+                thread=WorkflowThread.model_validate(wf),
+                status=data.get("status", wf.get("status", "processing")),
+                results=_history(_RESULTS_ADAPTER.validate_python(data.get("agent_results", []))),
+                messages=_history(_MESSAGES_ADAPTER.validate_python(data.get("messages", []))),
+                step=data.get("state") or {"current_step": "start"},
+            )
         except Exception as e:
-            print(f"[Checkpoint] load failed for {workflow_id}: {e}")
-            return None
+            logger.warning("Checkpoint load failed for %s: %s", workflow_id, e)
+            return None, None
+
+    def load_checkpoint(self, workflow_id: str) -> Optional[Dict]:
+        """Load persisted state if available and hydrate in-memory stores."""
+        data, ws = self._load_single(workflow_id)
+        if ws is not None:
+            self._install(workflow_id, ws)
+            self._seq[workflow_id] = data.get("seq", 0)
+            self._stats_version += 1
+        if data is not None:
+            logger.debug("Checkpoint loaded for %s", workflow_id)
+        return data
 
     def load_all_checkpoints(self) -> None:
         """Load all persisted workflows on startup."""
-        for checkpoint_file in self.checkpoint_dir.glob("*.json"):
-            workflow_id = checkpoint_file.stem
-            self.load_checkpoint(workflow_id)
+        workflow_ids = {path.stem for path in self.checkpoint_dir.glob("*.json")}
+        workflow_ids.update(path.stem for path in self.checkpoint_dir.glob("*.jsonl"))
+        if not workflow_ids:
+            return
+        # Reads and parsing overlap across threads; results are installed serially below
+        workflow_ids = sorted(workflow_ids)
+        with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as pool:
+            loaded = list(pool.map(self._load_single, workflow_ids))
+        for workflow_id, (data, ws) in zip(workflow_ids, loaded):
+            if ws is not None:
+                self._install(workflow_id, ws)
+                self._seq[workflow_id] = data.get("seq", 0)
+        self._stats_version += 1
+        logger.info("Loaded %d workflow checkpoints", len(self.state))
 
     # --- Simple execution scaffolding (can be replaced by LangGraph integration) ---
     def validate_user_input(self, workflow_id: str, user_input: str) -> Tuple[bool, str]:
-        if workflow_id not in self.workflows:
+        ws = self.state.get(workflow_id)
+        if not ws:
             return False, "Workflow not found"
-        current_messages = self.get_workflow_messages(workflow_id)
         # Naive detection based on last status stored
-        current_step = self.workflow_status.get(workflow_id, "start")
-        if current_step == "waiting_for_selection":
-            if user_input.isdigit():
-                n = int(user_input)
-                if 1 <= n <= 5:
-                    return True, ""
-                return False, "Please select a number between 1 and 5"
-            if user_input.lower() == "refine":
-                return True, ""
-            return False, "Please select an idea (1-5) or type 'refine'"
+        validator = _STEP_VALIDATORS.get(ws.status)
         # Default valid
-        return True, ""
+        return validator(user_input) if validator else (True, "")
 
     def subscribe_to_updates(self, workflow_id: str, callback: Callable[[Dict[str, Any]], None]) -> None:
         self._subscribers.setdefault(workflow_id, []).append(callback)
 
     def _notify_subscribers(self, workflow_id: str, data: Dict[str, Any]) -> None:
-        for cb in self._subscribers.get(workflow_id, []):
+        """Hand data to the workflow's subscribers; inside an event loop they run on a later
+        loop iteration, so a slow callback never delays the mutation that triggered it"""
+        callbacks = self._subscribers.get(workflow_id)
+        if not callbacks:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._dispatch(tuple(callbacks), data)
+            return
+        if self._queued_notifications >= _MAX_QUEUED_NOTIFICATIONS:
+            logger.warning("Dropping %s notification for %s: subscribers are falling behind", data.get("type"), workflow_id)
+            return
+        self._queued_notifications += 1
+        loop.call_soon(self._dispatch, tuple(callbacks), data, True)
+
+    def _dispatch(self, callbacks: Tuple[Callable, ...], data: Dict[str, Any], queued: bool = False) -> None:
+        if queued:
+            self._queued_notifications -= 1
+        for cb in callbacks:
             try:
-                cb(data)
+                result = cb(data)
+                if asyncio.iscoroutine(result):
+                    if queued:
+                        asyncio.ensure_future(result)
+                    else:
+                        result.close()
+                        logger.warning("Async subscriber skipped outside an event loop")
             except Exception as e:
-                print(f"Error in subscriber callback: {e}")
+                logger.error("Error in subscriber callback: %s", e)
 
     def execute_workflow_step(self, workflow_id: str, user_input: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        if workflow_id not in self.workflows:
+        ws = self.state.get(workflow_id)
+        if not ws:
             return None
-        checkpoint = self.load_checkpoint(workflow_id) or {}
-        state = checkpoint.get("state", {"current_step": "start"})
+        state = ws.step
         if user_input:
             state["user_input"] = user_input
             self.add_message(workflow_id, user_input, "user")
         try:
             result = self._run_workflow_step(workflow_id, state)
-            # Save state back into checkpoint bundle
-            data = self.load_checkpoint(workflow_id) or {}
-            data["state"] = state
-            with self._checkpoint_path(workflow_id).open("w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+            # Record the step state as one more checkpoint log entry
+            self._append_event(workflow_id, "state", _dumps(state).decode())
             self._notify_subscribers(workflow_id, {"type": "step", "workflow_id": workflow_id, "state": state})
             return result
         except Exception as e:
-            self.update_workflow_status(workflow_id, f"error: {e}")
+            self.update_workflow_status(workflow_id, f"{STATUS_ERROR_PREFIX}: {e}")
             return {"error": str(e)}
 
     def _run_workflow_step(self, workflow_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
         current_step = state.get("current_step", "start")
         if current_step == "start":
             # Mock ideation (replace with LangGraph call)
-            ideas = [{"title": f"Idea {i+1}", "summary": ""} for i in range(5)]
-            state["content_ideas"] = ideas
+            state["content_ideas"] = [dict(idea) for idea in _MOCK_IDEAS]
             state["current_step"] = "waiting_for_selection"
             self.update_workflow_status(workflow_id, "waiting_for_selection")
-            ideas_text = "\n".join([f"{i+1}. {it['title']}" for i, it in enumerate(ideas)])
-            self.add_agent_result(workflow_id, "ideation_agent", f"Generated ideas:\n{ideas_text}")
-            return {"required_input": {"kind": "selection", "options": [{"index": i+1, "title": it["title"]} for i, it in enumerate(ideas)]}}
+            self.add_agent_result(workflow_id, "ideation_agent", _MOCK_IDEAS_RESULT)
+            return {"required_input": {"kind": "selection", "options": [dict(option) for option in _MOCK_IDEA_OPTIONS]}}
         if current_step == "waiting_for_selection":
             ui = state.get("user_input", "").strip().lower()
             if ui.isdigit():
@@ -303,10 +723,9 @@ class WorkflowManager:
         return {"status": "processing"}
 
     def retry_workflow_step(self, workflow_id: str, step_name: str) -> Dict[str, Any]:
-        if workflow_id not in self.workflows:
+        ws = self.state.get(workflow_id)
+        if not ws:
             return {"error": "Workflow not found"}
         # naive reset of step
-        checkpoint = self.load_checkpoint(workflow_id) or {}
-        state = checkpoint.get("state", {"current_step": "start"})
-        state["current_step"] = step_name
+        ws.step["current_step"] = step_name
         return self.execute_workflow_step(workflow_id)